@@ -0,0 +1,47 @@
+// Lets interrupted uploads pick up where they left off. The uploader sends every file
+// in chunks and can't be told to skip any, so before each chunk goes out the server is
+// asked whether it already holds an identical one (same sha-256) from an earlier
+// attempt. If it does, the chunk is sent without its data.
+(() => {
+    const open = XMLHttpRequest.prototype.open;
+    const send = XMLHttpRequest.prototype.send;
+
+    XMLHttpRequest.prototype.open = function (method, url, ...rest) {
+        this.modashMethod = method;
+        this.modashUrl = url;
+        return open.call(this, method, url, ...rest);
+    };
+
+    XMLHttpRequest.prototype.send = function (body) {
+        if (
+            this.modashMethod !== 'POST'
+            || !(body instanceof FormData)
+            || !body.has('flowIdentifier')
+            || !(window.crypto && crypto.subtle)
+        ) {
+            return send.call(this, body);
+        }
+        body.get('file').arrayBuffer()
+            .then((chunk) => crypto.subtle.digest('SHA-256', chunk))
+            .then((digest) => {
+                const params = new URLSearchParams({
+                    flowIdentifier: body.get('flowIdentifier'),
+                    flowChunkNumber: body.get('flowChunkNumber'),
+                    sha256: Array.from(
+                        new Uint8Array(digest),
+                        (byte) => byte.toString(16).padStart(2, '0'),
+                    ).join(''),
+                });
+                const separator = this.modashUrl.includes('?') ? '&' : '?';
+                return fetch(this.modashUrl + separator + params);
+            })
+            .then((response) => {
+                if (response.ok) {
+                    body.set('file', new Blob([]), body.get('flowFilename'));
+                    body.set('chunk_cached', '1');
+                }
+            })
+            .catch(() => {})
+            .finally(() => send.call(this, body));
+    };
+})();
@@ -0,0 +1,204 @@
+"""Transfer benchmark for remote tdms files in MoDash.
+
+Writes MoSAIC-style tdms files with 20 channels, serves them from a local HTTP server
+and loads two of their channels through modash.load_data, the way the app does for a
+remote file. Reports how many bytes went over HTTP compared to the size of the file and
+to the size of the data needed (the two channels and their timestamps), first with an
+empty block cache and then again with the cache filled, and checks that the data
+matches reading the file from disk.
+
+The files cover the layouts seen in practice, see CASES: large segments, small
+segments as written by a streaming acquisition, with and without a .tdms_index file
+next to them, and a server which doesn't identify the version of the file.
+
+"python -m http.server" ignores range requests, so the file is served by a minimal
+handler which supports them, as nginx or Apache would.
+
+Usage:
+    python benchmarks/remote_transfer.py [--megabytes N] [--budget MULTIPLE]
+
+Exits with a non-zero status if the cold read of any case transfers more than the
+budgeted multiple of the data needed.
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+
+import numpy as np
+
+REPO_PATH = Path(__file__).resolve().parents[1]
+
+# Target for the bytes transferred, as a multiple of the bytes of the data needed. The
+# rest goes to the metadata and to rounding reads up to whole blocks
+TRANSFER_BUDGET = 1.5
+
+N_CHANNELS = 20
+
+# name: (samples per segment, whether to write a .tdms_index file, whether the server
+# sends Last-Modified)
+CASES = {
+    'large segments': (50_000, False, True),
+    'small segments': (2_000, False, True),
+    'small segments, indexed': (2_000, True, True),
+    'small segments, no validator': (2_000, False, False),
+}
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler which supports single byte ranges and counts bytes sent."""
+
+    protocol_version = 'HTTP/1.1'
+    # like nginx, or every small response waits on the client's delayed ack
+    disable_nagle_algorithm = True
+    bytes_sent = 0
+    bytes_sent_lock = Lock()
+    send_validator = True
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body: bool):
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            self.send_error(404)
+            return
+        size = path.stat().st_size
+        start, stop = 0, size
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match[1])
+            stop = min(int(match[2]) + 1, size) if match[2] else size
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{stop - 1}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(stop - start))
+        if self.send_validator:
+            self.send_header(
+                'Last-Modified', self.date_time_string(path.stat().st_mtime)
+            )
+        self.end_headers()
+        if body:
+            with open(path, 'rb') as file:
+                file.seek(start)
+                self.wfile.write(file.read(stop - start))
+            with self.bytes_sent_lock:
+                type(self).bytes_sent += stop - start
+
+    def log_message(self, *args):
+        pass
+
+
+def write_tdms(path: Path, megabytes: int, samples_per_segment: int, index_file: bool):
+    """Writes a MoSAIC-style tdms file of about the given size, one segment at a time."""
+    from nptdms import ChannelObject, TdmsWriter
+
+    segment_bytes = samples_per_segment * (N_CHANNELS * 8 + 16)
+    n_segments = max(megabytes * 1024**2 // segment_bytes, 1)
+    rng = np.random.default_rng(0)
+    start = np.datetime64('2025-01-01T00:00:00', 'us')
+    # nptdms only writes the index next to paths given as strings
+    with TdmsWriter(str(path), index_file=index_file) as writer:
+        for segment in range(n_segments):
+            offsets = np.arange(samples_per_segment) + segment * samples_per_segment
+            writer.write_segment(
+                [
+                    ChannelObject(
+                        'TimeStamps',
+                        'Fast',
+                        start + offsets.astype('timedelta64[ms]'),
+                    )
+                ]
+                + [
+                    ChannelObject(
+                        'RTAC Data',
+                        f'C{index}',
+                        rng.normal(size=samples_per_segment),
+                        properties={'Xaxis': 'TimeStamps/Fast'},
+                    )
+                    for index in range(N_CHANNELS)
+                ]
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--megabytes', type=int, default=200)
+    parser.add_argument('--budget', type=float, default=TRANSFER_BUDGET)
+    args = parser.parse_args()
+
+    over_budget = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # modash keeps its caches relative to the working directory
+        os.chdir(tmp)
+        sys.path.insert(0, str(REPO_PATH))
+        import modash
+
+        served_path = Path(tmp) / 'served'
+        served_path.mkdir()
+        server = ThreadingHTTPServer(
+            ('127.0.0.1', 0),
+            lambda *handler_args: RangeRequestHandler(
+                *handler_args, directory=str(served_path)
+            ),
+        )
+        Thread(target=server.serve_forever, daemon=True).start()
+        channels = {'C3', 'C11'}
+
+        for case, (samples_per_segment, index_file, validator) in CASES.items():
+            tdms_path = served_path / f'{case.replace(" ", "_")}.tdms'
+            write_tdms(tdms_path, args.megabytes, samples_per_segment, index_file)
+            size = tdms_path.stat().st_size
+            # 8 bytes per value and 16 bytes per timestamp
+            needed = size * (len(channels) * 8 + 16) // (N_CHANNELS * 8 + 16)
+            url = f'http://127.0.0.1:{server.server_port}/{tdms_path.name}'
+            RangeRequestHandler.send_validator = validator
+            print(
+                f'{case}: file {size / 1024**2:.1f} MB, '
+                f'data needed {needed / 1024**2:.1f} MB'
+            )
+
+            cold_bytes = 0
+            for run in ['cold', 'warm']:
+                RangeRequestHandler.bytes_sent = 0
+                start = time.perf_counter()
+                remote_df = modash.load_data([(url, None)], channels)
+                duration = time.perf_counter() - start
+                transferred = RangeRequestHandler.bytes_sent
+                cold_bytes = cold_bytes or transferred
+                print(
+                    f'  {run}: {transferred / 1024**2:.1f} MB transferred in '
+                    f'{duration:.2f} s, {transferred / size:.1%} of the file and '
+                    f'{transferred / needed:.2f} times the data needed'
+                )
+
+            local_df = modash.load_data([(tdms_path, None)], channels)
+            if not remote_df.equals(local_df):
+                print(f'Remote data differs from the local file for {case}.')
+                sys.exit(1)
+            if cold_bytes > args.budget * needed:
+                over_budget.append(case)
+        server.shutdown()
+        os.chdir(REPO_PATH)
+
+    if over_budget:
+        print(
+            f'Transfer is over budget ({args.budget:.2f} times the data needed) for '
+            f'{", ".join(over_budget)}.'
+        )
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Startup-time benchmark for MoDash.
+
+Measures how long it takes from launching a fresh interpreter until the app is ready to
+be served: importing modash (which builds the layout and registers the callbacks) and
+kicking off the clean up of previous uploads. Each run happens in a new process so
+nothing is already cached in sys.modules, and in a scratch working directory filled
+with fake uploads from a previous session so the clean up has something to chew on.
+
+Usage:
+    python benchmarks/startup.py [--runs N] [--budget SECONDS]
+
+Exits with a non-zero status if the median startup time is over budget.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_PATH = Path(__file__).resolve().parents[1]
+
+# Target for the median time until the app is ready to be served
+STARTUP_BUDGET_S = 1.0
+
+STARTUP_SNIPPET = f"""
+import sys
+import time
+
+start = time.perf_counter()
+sys.path.insert(0, {str(REPO_PATH)!r})
+import modash
+
+modash.start_cleanup()
+print(time.perf_counter() - start)
+"""
+
+
+def fill_previous_session(path: Path, n_uploads: int = 200, n_bytes: int = 1024**2):
+    """Creates fake uploads which are older than the retention period."""
+    old = time.time() - 30 * 24 * 3600
+    for index in range(n_uploads):
+        upload_path = path / 'uploads' / f'upload-{index}'
+        upload_path.mkdir(parents=True)
+        tdms_path = upload_path / 'old.tdms'
+        tdms_path.write_bytes(os.urandom(n_bytes))
+        os.utime(tdms_path, (old, old))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_S)
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            fill_previous_session(Path(tmp))
+            result = subprocess.run(
+                [sys.executable, '-c', STARTUP_SNIPPET],
+                cwd=tmp,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            timings.append(float(result.stdout.strip().splitlines()[-1]))
+
+    median = statistics.median(timings)
+    print(f'startup times (s): {", ".join(f"{t:.3f}" for t in timings)}')
+    print(f'median: {median:.3f} s, budget: {args.budget:.3f} s')
+    if median > args.budget:
+        print('Startup is over budget.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
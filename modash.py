@@ -9,30 +9,41 @@
 #       - all files normalized to zero with different color traces for each file...
 #       - files concatenated with vlines at file boundaries
 
-# TODO: add button to save options and possibly channel selections as defaults or even
-# to a file so they can be recalled later
-
 # TODO: Add feature to add dimension of test number from within MoSAIC TDMS files
 
 # TODO: Add hover events to legend to highlight traces when you hover over their entries
 # in the legend
 
-# TODO: Add ability to add more than two y-axes
-
 # TODO: Update README to include explanation of resampling features
 
+import argparse
+import glob
+import hashlib
 import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import uuid
 import webbrowser
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime as dt
+from datetime import timedelta
+from itertools import chain
 from pathlib import Path
-from threading import Timer
+from threading import Lock, Thread, Timer
+from typing import TYPE_CHECKING, ClassVar
 
 import dash_bootstrap_components as dbc
 import dash_uploader as du
-import nptdms
+import numpy as np
 import plotly.graph_objects as go
-import polars as pl
+from dash import Patch
 from dash_extensions.enrich import (
+    ALL,
     DashProxy,
     Input,
     Output,
@@ -45,9 +56,19 @@ from dash_extensions.enrich import (
     html,
     no_update,
 )
+from dash_uploader.httprequesthandler import RequestData
+from flask import request
 from loguru import logger
-from plotly.subplots import make_subplots
-from plotly_resampler import FigureResampler
+
+from remote import REMOTE_CACHE_PATH, RemoteFile, is_url, url_name
+
+# nptdms, polars and plotly_resampler (which pulls in pandas) account for about half of
+# the import time of this module, so they are only imported when first needed
+if TYPE_CHECKING:
+    import nptdms
+    import polars as pl
+
+    from resampling import ParallelFigureResampler
 
 logger.add('logs/modash.log', rotation='10 MB', retention='90 days', colorize=False)
 
@@ -61,34 +82,319 @@ app = DashProxy(
 UPLOAD_PATH = Path('./uploads/')
 UPLOAD_PATH.mkdir(exist_ok=True)
 CACHE_PATH = Path('./file_system_backend/')
+# chunks of uploads still in progress, kept per file rather than per upload id so an
+# interrupted upload can be resumed from a new session
+UPLOAD_CHUNKS_PATH = UPLOAD_PATH / 'chunks'
+# completed uploads, stored once per content hash
+UPLOAD_FILES_PATH = UPLOAD_PATH / 'files'
+# decoded channel data, stored per content hash of the file it came from
+DECODED_PATH = Path('./decoded/')
+# saved workspaces, which are never cleaned up automatically
+WORKSPACE_PATH = Path('./workspaces/')
+WORKSPACE_PATH.mkdir(exist_ok=True)
+# snapshot files behind the workspaces, each written once under a unique name. Those no
+# workspace refers to any more are cleaned up like the cache
+WORKSPACE_SNAPSHOTS_PATH = WORKSPACE_PATH / 'snapshots'
+
+# Uploads and cached figures from previous sessions are kept until they are older than
+# RETENTION_MAX_AGE, or until their directory grows past RETENTION_MAX_BYTES, in which
+# case the oldest files are deleted first. Setting the max age to zero deletes
+# everything from previous sessions.
+RETENTION_MAX_AGE = timedelta(days=7)
+RETENTION_MAX_BYTES = 20 * 1024**3
+
+# In compact memory mode, channels are only stored as float32 if none of their values
+# change by more than this fraction of the channel's range
+COMPACT_TOLERANCE = 1e-6
+
+
+def clean_up_old_files(
+    paths: list[Path],
+    max_age: timedelta = RETENTION_MAX_AGE,
+    max_bytes: int = RETENTION_MAX_BYTES,
+):
+    """Deletes old files from the given directories according to the retention policy.
 
-# deleting all previous uploads and cache
-for path in [UPLOAD_PATH, CACHE_PATH]:
-    for item in sorted(path.glob('**/*'), reverse=True):
-        if item.is_file():
-            item.unlink()
-        if item.is_dir():
-            item.rmdir()
-du.configure_upload(app, folder=UPLOAD_PATH)
-
-primary_dropdown = dcc.Dropdown(
-    id='primary_dropdown',
-    multi=True,
-    clearable=True,
-    searchable=True,
-    placeholder='Type here to search, enter or tab to select',
-    style={'margin-top': 5},
-)
+    Args:
+        paths (list[Path]): directories to clean up, each one is handled separately
+        max_age (timedelta): files last modified longer ago than this are deleted
+        max_bytes (int): the oldest remaining files are deleted until the total size of
+            each directory is under this limit
+    """
+    oldest_allowed = time.time() - max_age.total_seconds()
+    for path in paths:
+        files, dirs = [], []
+        for item in path.glob('**/*'):
+            try:
+                if item.is_file():
+                    files.append((item.stat().st_mtime, item.stat().st_size, item))
+                elif item.is_dir():
+                    dirs.append(item)
+            except FileNotFoundError:
+                continue
+        files.sort()
+        total_bytes = sum(size for _, size, _ in files)
+        n_deleted = 0
+        for mtime, size, item in files:
+            if mtime >= oldest_allowed and total_bytes <= max_bytes:
+                break
+            # the app is already serving while this runs, so a file which was touched
+            # since it was listed (e.g. the stored copy of a repeated upload) is in use
+            try:
+                if item.stat().st_mtime > mtime:
+                    continue
+            except FileNotFoundError:
+                continue
+            item.unlink(missing_ok=True)
+            total_bytes -= size
+            n_deleted += 1
+        # removing directories left empty, deepest first. Only directories which
+        # existed before the clean up began are considered, so an upload started in
+        # the meantime doesn't get its directory pulled out from under it.
+        for item in sorted(dirs, reverse=True):
+            try:
+                if not any(item.iterdir()):
+                    item.rmdir()
+            except OSError:
+                continue
+        logger.info(
+            f'Deleted {n_deleted} old files from {path}, '
+            f'{total_bytes / 1024**2:.1f} MB retained.'
+        )
 
-secondary_dropdown = dcc.Dropdown(
-    id='secondary_dropdown',
-    multi=True,
-    clearable=True,
-    searchable=True,
-    placeholder='Type here to search, enter or tab to select',
-    style={'margin-top': 5},
+
+def clean_up_snapshots(max_age: timedelta = RETENTION_MAX_AGE):
+    """Deletes old snapshot files which no saved workspace refers to any more.
+
+    A snapshot is left behind when its workspace is saved again under the same name,
+    and figures opened from it may still be in the server-side cache, which memory map
+    the snapshot instead of holding a copy. Pickling such a figure touches the snapshot,
+    so it is only deleted once those cached figures have expired too.
+
+    Args:
+        max_age (timedelta): unreferenced snapshots last modified longer ago than this
+            are deleted
+    """
+    oldest_allowed = time.time() - max_age.total_seconds()
+    referenced = set()
+    for alias in WORKSPACE_PATH.glob('*.modash'):
+        try:
+            referenced.add(workspace_snapshot(alias))
+        except (OSError, ValueError):
+            continue
+    n_deleted = 0
+    for item in WORKSPACE_SNAPSHOTS_PATH.glob('*'):
+        try:
+            if item in referenced or item.stat().st_mtime >= oldest_allowed:
+                continue
+        except FileNotFoundError:
+            continue
+        item.unlink(missing_ok=True)
+        n_deleted += 1
+    logger.info(
+        f'Deleted {n_deleted} replaced snapshots from {WORKSPACE_SNAPSHOTS_PATH}.'
+    )
+
+
+def clean_up():
+    """Applies the retention policy to the uploads, caches and replaced snapshots."""
+    clean_up_old_files([UPLOAD_PATH, CACHE_PATH, DECODED_PATH, REMOTE_CACHE_PATH])
+    clean_up_snapshots()
+
+
+def start_cleanup() -> Thread:
+    """Runs the clean up of previous uploads and cache in a background thread.
+
+    Walking and deleting many large uploads can take a while, so this doesn't hold up
+    the server from starting.
+
+    Returns:
+        Thread: the daemon thread running the clean up
+    """
+    cleanup = Thread(
+        target=clean_up,
+        name='cleanup',
+        daemon=True,
+    )
+    cleanup.start()
+    return cleanup
+
+
+def safe_name(name: str) -> str:
+    """Replaces anything in a client supplied identifier which isn't path safe."""
+    return re.sub(r'[^0-9a-zA-Z_-]', '_', name)
+
+
+def stored_upload(digest: str) -> Path | None:
+    """Returns the stored upload with the given content hash, if there is one."""
+    for path in (UPLOAD_FILES_PATH / digest).glob('*'):
+        if path.suffix != '.part':
+            return path
+    return None
+
+
+class HashingHttpRequestHandler(du.HttpRequestHandler):
+    """Upload handler which hashes files as their chunks arrive.
+
+    Chunks are kept in UPLOAD_CHUNKS_PATH under the uploader's identifier for the file
+    (its size and name) instead of under the upload id. Before sending each chunk,
+    assets/resume_upload.js asks the server whether it already holds an identical one
+    from an interrupted upload, and if so sends the chunk without its data.
+
+    The sha-256 of the file is updated as soon as the chunks are available in order, so
+    it is known the moment the last chunk lands. Completed files are stored once per
+    hash in UPLOAD_FILES_PATH, so uploading a file which is already there just discards
+    the chunks. Either way, a sidecar file containing the hash is written where
+    dash_uploader reports the upload to be, which is how on_upload finds the stored
+    copy.
+    """
+
+    # running hash of each file being uploaded: (hasher, number of next chunk to hash)
+    hashers: ClassVar[dict[str, tuple]] = {}
+    hashers_lock = Lock()
+
+    def get(self):
+        """Answers whether an identical chunk was already received."""
+        chunk_path = (
+            UPLOAD_CHUNKS_PATH
+            / safe_name(request.args.get('flowIdentifier', ''))
+            / str(request.args.get('flowChunkNumber', 0, type=int))
+        )
+        if chunk_path.is_file() and hashlib.sha256(
+            chunk_path.read_bytes()
+        ).hexdigest() == request.args.get('sha256'):
+            return 'OK'
+        return 'Not found', 404
+
+    def _post(self):
+        r = RequestData(request)
+        chunks_path = UPLOAD_CHUNKS_PATH / safe_name(r.unique_identifier)
+        chunk_path = chunks_path / str(r.chunk_number)
+        if request.form.get('chunk_cached') == '1':
+            if not chunk_path.is_file():
+                logger.warning(f'Chunk {chunk_path} was claimed cached but is missing.')
+                return 'Chunk no longer cached', 500
+        else:
+            chunks_path.mkdir(parents=True, exist_ok=True)
+            # writing under another name first so a chunk only ever exists complete
+            partial_path = chunks_path / f'{r.chunk_number}.part'
+            r.chunk_data.save(partial_path)
+            partial_path.replace(chunk_path)
+            # a chunk which was already hashed got replaced, e.g. by another file with
+            # the same name and size as an interrupted upload, so the hash starts over
+            with self.hashers_lock:
+                _, next_chunk = self.hashers.get(chunks_path.name, (None, 1))
+                if r.chunk_number < next_chunk:
+                    del self.hashers[chunks_path.name]
+
+        digest = self.hash_chunks(chunks_path, r.n_chunks_total)
+        if digest is not None:
+            self.store_upload(chunks_path, r, digest)
+        return r.filename
+
+    def hash_chunks(self, chunks_path: Path, n_chunks_total: int) -> str | None:
+        """Feeds the chunks which are available in order into the running hash.
+
+        Args:
+            chunks_path (Path): directory with the chunks of the file
+            n_chunks_total (int): number of chunks the file is split into
+
+        Returns:
+            str | None: the hex digest of the file once all its chunks were hashed. Only
+                the call which hashes the last chunk gets it, every other call gets None
+        """
+        with self.hashers_lock:
+            hasher, next_chunk = self.hashers.get(
+                chunks_path.name, (hashlib.sha256(), 1)
+            )
+            while next_chunk <= n_chunks_total:
+                chunk_path = chunks_path / str(next_chunk)
+                if not chunk_path.is_file():
+                    self.hashers[chunks_path.name] = (hasher, next_chunk)
+                    return None
+                hasher.update(chunk_path.read_bytes())
+                next_chunk += 1
+            self.hashers.pop(chunks_path.name, None)
+            return hasher.hexdigest()
+
+    def store_upload(self, chunks_path: Path, r: RequestData, digest: str):
+        """Assembles the chunks into the stored upload, unless it is already stored.
+
+        Args:
+            chunks_path (Path): directory with the chunks of the file
+            r (RequestData): the request which delivered the last chunk
+            digest (str): sha-256 hex digest of the file
+        """
+        filename = Path(r.filename).name
+        existing_path = stored_upload(digest)
+        if existing_path is not None:
+            logger.info(f'{filename} is identical to {existing_path}, reusing it.')
+            # refreshing its age so the retention clean up keeps it around
+            existing_path.touch()
+        else:
+            stored_path = UPLOAD_FILES_PATH / digest / filename
+            stored_path.parent.mkdir(parents=True, exist_ok=True)
+            partial_path = stored_path.with_name(filename + '.part')
+            with open(partial_path, 'wb') as stored_file:
+                for chunk_number in range(1, r.n_chunks_total + 1):
+                    with open(chunks_path / str(chunk_number), 'rb') as chunk_file:
+                        shutil.copyfileobj(chunk_file, stored_file)
+            partial_path.replace(stored_path)
+            logger.info(f'{filename} stored as {stored_path}.')
+        shutil.rmtree(chunks_path, ignore_errors=True)
+
+        sidecar_path = self.get_upload_session_root(safe_name(r.upload_id)) / (
+            filename + '.sha256'
+        )
+        sidecar_path.parent.mkdir(parents=True, exist_ok=True)
+        sidecar_path.write_text(digest)
+
+
+du.configure_upload(
+    app, folder=UPLOAD_PATH, http_request_handler=HashingHttpRequestHandler
 )
 
+
+def axis_name(index: int) -> str:
+    """Returns the human readable name of the y-axis at the given index."""
+    if index == 0:
+        return 'Primary Axis'
+    if index == 1:
+        return 'Secondary Axis'
+    return f'Axis {index + 1}'
+
+
+def axis_selection(
+    index: int, options: list[str] | None = None, value: list[str] | None = None
+) -> dbc.Alert:
+    """Builds the block with the channel dropdown for the y-axis at the given index.
+
+    Args:
+        index (int): position of the y-axis, 0 being the primary axis
+        options (list[str] | None): channels to offer in the dropdown, if already known
+        value (list[str] | None): channels already selected for the axis
+
+    Returns:
+        dbc.Alert: container with the axis name and its pattern-matching dropdown
+    """
+    return dbc.Alert(
+        [
+            html.Div(f'{axis_name(index)}:'),
+            dcc.Dropdown(
+                id={'type': 'axis_dropdown', 'index': index},
+                options=options or [],
+                value=value,
+                multi=True,
+                clearable=True,
+                searchable=True,
+                placeholder='Type here to search, enter or tab to select',
+                style={'margin-top': 5},
+            ),
+        ],
+        style={'margin-top': 5, 'margin-bottom': 0},
+    )
+
+
 file_selection = du.Upload(
     max_file_size=1500,
     max_files=15,
@@ -106,6 +412,31 @@ file_list = dash_table.DataTable(
     style_cell={'textAlign': 'left'},
 )
 
+remote_url_input = dbc.Input(
+    id='remote_url_input',
+    type='url',
+    placeholder='http://server/path/file.tdms',
+)
+add_remote_button = dbc.Button(
+    'Add Remote File', outline=True, color='primary', id='add_remote_button'
+)
+
+add_axis_button = dbc.Button(
+    'Add Axis',
+    outline=True,
+    color='primary',
+    id='add_axis_button',
+    style={'margin-top': 5},
+)
+
+compact_switch = dbc.Switch(
+    id='compact_switch',
+    label='Compact memory mode',
+    value=False,
+    persistence=True,
+    persistence_type='local',
+    style={'margin-top': 5},
+)
 data_mgmt_canvas_button = dbc.Button(
     'Data Management', outline=True, color='primary', id='data_mgmt_canvas_button'
 )
@@ -183,6 +514,77 @@ plotly_js_radio = dbc.RadioItems(
     id='plotly_js_radio',
 )
 
+workspace_canvas_button = dbc.Button(
+    'Workspaces',
+    outline=True,
+    color='secondary',
+    id='workspace_canvas_button',
+    style={'margin-left': 5},
+)
+workspace_name_input = dbc.Input(
+    id='workspace_name_input',
+    placeholder='Workspace name',
+    value='MoDash-<fdt>',
+)
+save_workspace_button = dbc.Button(
+    'Save Workspace',
+    outline=True,
+    color='secondary',
+    id='save_workspace_button',
+    style={'margin-top': 5},
+)
+workspace_dropdown = dcc.Dropdown(
+    id='workspace_dropdown',
+    clearable=True,
+    searchable=True,
+    placeholder='Select a saved workspace',
+)
+open_workspace_button = dbc.Button(
+    'Open Workspace',
+    outline=True,
+    color='secondary',
+    id='open_workspace_button',
+    style={'margin-top': 5},
+)
+
+spectrum_canvas_button = dbc.Button(
+    'Spectrum',
+    outline=True,
+    color='dark',
+    id='spectrum_canvas_button',
+    style={'margin-left': 5},
+)
+spectrum_channels_dropdown = dcc.Dropdown(
+    id='spectrum_channels_dropdown',
+    multi=True,
+    clearable=True,
+    searchable=True,
+    placeholder='Select plotted channels',
+)
+spectrum_method_radio = dbc.RadioItems(
+    {
+        'psd': 'Power spectral density (Welch)',
+        'fft': 'Amplitude spectrum (FFT)',
+    },
+    persistence=True,
+    persistence_type='local',
+    value='psd',
+    id='spectrum_method_radio',
+)
+spectrum_nperseg_dropdown = dcc.Dropdown(
+    [2**power for power in range(8, 17)],
+    value=4096,
+    clearable=False,
+    persistence=True,
+    persistence_type='local',
+    id='spectrum_nperseg_dropdown',
+)
+spectrum_graph = dcc.Graph(
+    id='spectrum_graph',
+    style={'height': '38vh'},
+    config={'displaylogo': False},
+)
+
 # This button's style is set to 'none' so it doesn't appear in the layout. It's meant to
 # be hidden and only exists to interact with the dash callback to shutdown the server
 shutdown_button = html.Button(id='shutdown_button', style={'display': 'none'})
@@ -195,14 +597,17 @@ data_mgmt_canvas = dbc.Offcanvas(
                     [
                         file_selection,
                         file_list,
-                        dbc.Alert(
-                            [html.Div('Primary Axis:'), primary_dropdown],
-                            style={'margin-top': 5, 'margin-bottom': 0},
+                        dbc.InputGroup(
+                            [remote_url_input, add_remote_button],
+                            style={'margin-top': 5},
                         ),
-                        dbc.Alert(
-                            [html.Div('Secondary Axis:'), secondary_dropdown],
-                            style={'margin-top': 5, 'margin-bottom': 0},
+                        html.Div(id='remote_status'),
+                        html.Div(
+                            [axis_selection(0), axis_selection(1)],
+                            id='axis_selections',
                         ),
+                        add_axis_button,
+                        compact_switch,
                     ]
                 )
             ]
@@ -310,6 +715,96 @@ export_canvas = dbc.Offcanvas(
     id='export_canvas',
 )
 
+workspace_canvas = dbc.Offcanvas(
+    [
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        dbc.Alert(
+                            [
+                                html.Div('Save current workspace as:'),
+                                workspace_name_input,
+                                save_workspace_button,
+                            ],
+                            style={'margin-top': 0, 'margin-bottom': 5},
+                            color='secondary',
+                        ),
+                        dbc.Alert(
+                            [
+                                html.Div('Open saved workspace:'),
+                                workspace_dropdown,
+                                open_workspace_button,
+                            ],
+                            style={'margin-top': 0, 'margin-bottom': 5},
+                            color='secondary',
+                        ),
+                        dbc.Alert(
+                            [
+                                html.Div(
+                                    'A workspace holds the file list, axis selections, '
+                                    'layout, zoom and the plotted data itself, so it '
+                                    'opens without reading the tdms files again. The '
+                                    'same placeholders as for export filenames can be '
+                                    'used in its name.'
+                                ),
+                                html.Div(id='workspace_status'),
+                            ],
+                            color='warning',
+                            style={'margin-top': 5, 'margin-bottom': 0},
+                        ),
+                    ]
+                )
+            ]
+        )
+    ],
+    is_open=False,
+    close_button=False,
+    id='workspace_canvas',
+)
+
+spectrum_canvas = dbc.Offcanvas(
+    [
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        dbc.Alert(
+                            [
+                                html.Div('Channels:'),
+                                spectrum_channels_dropdown,
+                                html.Div('Method:', style={'margin-top': 5}),
+                                spectrum_method_radio,
+                                html.Div(
+                                    'Samples per segment (Welch):',
+                                    style={'margin-top': 5},
+                                ),
+                                spectrum_nperseg_dropdown,
+                            ],
+                            style={'margin-top': 0, 'margin-bottom': 5},
+                            color='dark',
+                        ),
+                        dbc.Alert(
+                            'Computed from the full resolution data of the visible '
+                            'x-range, and updated on every zoom or pan.',
+                            color='warning',
+                            style={'margin-top': 5, 'margin-bottom': 0},
+                        ),
+                    ],
+                    width=3,
+                ),
+                dbc.Col(spectrum_graph, width=9),
+            ]
+        )
+    ],
+    is_open=False,
+    close_button=False,
+    placement='bottom',
+    backdrop=False,
+    style={'height': '45vh'},
+    id='spectrum_canvas',
+)
+
 tdms_graph = dcc.Graph(
     id='tdms_graph',
     config={
@@ -333,6 +828,8 @@ app.layout = dbc.Container(
                         data_mgmt_canvas_button,
                         new_tab_button,
                         export_canvas_button,
+                        workspace_canvas_button,
+                        spectrum_canvas_button,
                         shutdown_button,
                         dcc.Loading(tdms_graph),
                     ],
@@ -343,9 +840,13 @@ app.layout = dbc.Container(
         ),
         data_mgmt_canvas,
         export_canvas,
+        workspace_canvas,
+        spectrum_canvas,
         dcc.Store(id='paths_store'),
+        dcc.Store(id='channels_store'),
         dcc.Store(id='timestamp_store'),
         dcc.Store(id='figure_cache'),
+        dcc.Store(id='relayout_store'),
     ],
 )
 
@@ -403,8 +904,7 @@ def toggle_export_canvas(
 
 @du.callback(
     [
-        Output(primary_dropdown.id, 'options'),
-        Output(secondary_dropdown.id, 'options'),
+        Output('channels_store', 'data'),
         Output('paths_store', 'data'),
     ],
     id=file_selection.id,
@@ -412,196 +912,685 @@ def toggle_export_canvas(
 def on_upload(status: du.UploadStatus):
     """Populates files and channels lists with data from tdms files.
 
+    Uploads are stored once per content hash by HashingHttpRequestHandler, so the paths
+    reported by dash_uploader are resolved to the stored copies through the sidecar
+    files containing their hashes.
+
     Args:
         status (dash_uploader.UploadStatus): object which contains various pieces of
             information about the upload progress and status when complete
 
     Returns:
-        tuple of length 3:
+        tuple of length 2:
             list[str]: list of strings representing channels found in the tdms files to
-                populate the primary axis dropdown menu
-            list[str]: same but for the secondary axis dropdown menu
-            str: list of paths to the uploaded files but serialized into json so it can
-                be put into a server-side data store
+                populate the axis dropdown menus
+            str: list of dicts with the path and sha-256 hex digest of each uploaded
+                file but serialized into json so it can be put into a server-side data
+                store
 
     """
     # TODO: Add ability to also handle and concatenate CSV files
     if status.is_completed and status.n_uploaded > 0:
+        import nptdms
+
         logger.info(f'New files uploaded. Uploader status: {status}')
-        files_to_add = json.dumps([str(path) for path in status.uploaded_files])
+        files_to_add = []
+        for upload_path in status.uploaded_files:
+            digest = Path(f'{upload_path}.sha256').read_text()
+            files_to_add.append({'path': str(stored_upload(digest)), 'sha256': digest})
         all_channels = set()
-        for tdms_path in status.uploaded_files:
-            tdms = nptdms.TdmsFile.open(tdms_path)
+        for file in files_to_add:
+            tdms = nptdms.TdmsFile.open(file['path'])
             channels = [channel.name for channel in tdms['RTAC Data'].channels()]
             all_channels.update(channels)
         all_channels = list(all_channels)
         logger.info(f'Channels discovered in tdms files: {all_channels}')
         return (
             all_channels,
-            all_channels,
-            files_to_add,
+            json.dumps(files_to_add),
         )
     return no_update
 
 
+@callback(
+    Output('channels_store', 'data', allow_duplicate=True),
+    Output('paths_store', 'data', allow_duplicate=True),
+    Output('remote_status', 'children'),
+    Input(add_remote_button.id, 'n_clicks'),
+    State(remote_url_input.id, 'value'),
+    prevent_initial_call=True,
+)
+def on_add_remote(_, url: str | None):
+    """Adds a tdms file served over HTTP to the files list without downloading it.
+
+    Only the metadata of the file is read here, through range requests. The data of
+    the selected channels is read the same way once the data management canvas is
+    closed.
+
+    Args:
+        url (str | None): http or https url of the tdms file
+
+    Returns:
+        tuple of length 3:
+            list[str]: channels found in the tdms file to populate the axis dropdowns
+            str: json serialized list with a dict holding the url and digest of the
+                remote file, like the uploaded files in on_upload
+            str: status message to show below the url input
+    """
+    import nptdms
+    import requests
+
+    if not url:
+        return no_update
+    if not is_url(url):
+        return no_update, no_update, 'Only http and https urls are supported.'
+    logger.info(f'Adding remote file {url}.')
+    try:
+        remote_file = RemoteFile(url)
+        with nptdms.TdmsFile.open(remote_file) as tdms:
+            channels = [channel.name for channel in tdms['RTAC Data'].channels()]
+    except (OSError, ValueError, KeyError, requests.RequestException) as error:
+        logger.exception(f'Could not open {url}')
+        return no_update, no_update, f'Could not open {url}: {error}'
+    logger.info(f'Channels discovered in {url}: {channels}')
+    status = (
+        f'Added {url_name(url)}, read {remote_file.bytes_fetched / 1024**2:.1f} MB '
+        f'of {remote_file.size / 1024**2:.1f} MB.'
+    )
+    return channels, json.dumps([{'path': url, 'sha256': remote_file.digest}]), status
+
+
+@callback(
+    Output({'type': 'axis_dropdown', 'index': ALL}, 'options'),
+    Input('channels_store', 'data'),
+    State({'type': 'axis_dropdown', 'index': ALL}, 'id'),
+    prevent_initial_call=True,
+)
+def on_channels_discovered(channels: list[str], dropdown_ids: list[dict]):
+    """Populates every axis dropdown with the channels found in the uploaded files.
+
+    Args:
+        channels (list[str]): channels found in the tdms files
+        dropdown_ids (list[dict]): ids of the axis dropdowns currently in the layout
+
+    Returns:
+        list[list[str]]: the channel options for each axis dropdown
+    """
+    return [channels for _ in dropdown_ids]
+
+
+@callback(
+    Output('axis_selections', 'children'),
+    Input(add_axis_button.id, 'n_clicks'),
+    State('channels_store', 'data'),
+    State({'type': 'axis_dropdown', 'index': ALL}, 'id'),
+    prevent_initial_call=True,
+)
+def on_add_axis(_, channels: list[str] | None, dropdown_ids: list[dict]):
+    """Appends a dropdown for another y-axis to the data management canvas.
+
+    Args:
+        channels (list[str] | None): channels found in the tdms files so far
+        dropdown_ids (list[dict]): ids of the axis dropdowns currently in the layout
+
+    Returns:
+        dash.Patch: appends the new axis block to the list of axis selections
+    """
+    index = len(dropdown_ids)
+    logger.info(f'Adding {axis_name(index)}.')
+    axis_selections = Patch()
+    axis_selections.append(axis_selection(index, channels))
+    return axis_selections
+
+
 @callback(
     Output(file_list.id, 'data'),
     Input('paths_store', 'data'),
     State(file_list.id, 'data'),
     prevent_initial_call=True,
 )
-def on_add_files(new_paths_json: str, current_rows: list[dict]):
+def on_add_files(new_files_json: str, current_rows: list[dict]):
     """Updates file list when new files are uploaded.
 
     Fires when paths are added to the data store by the "on_upload" method. This chained
     callback using a data store is required because the special callback provided by the
     dash_uploader library doesn't allow you to pass State objects into it, so the
-    callback can't get the current list of files to modify.
+    callback can't get the current list of files to modify. Files are deduplicated by
+    their content hash, so the same file uploaded twice only shows up once.
 
     Args:
-        new_paths_json (str): json serialized list of paths to newly uploaded files
+        new_files_json (str): json serialized list of dicts with the path and sha-256
+            hex digest of each newly uploaded file. Remote files have their url as path
+            and a digest of their url and version instead
         current_rows (list[dict]): list of rows currently in the files list already.
             Each item has the format:
                 {
                     'filename': <string containing just the filename>,
-                    'id': <string to full path of uploaded file>
+                    'id': <string to full path of uploaded file>,
+                    'sha256': <string containing the hex digest of the file>
                 }
 
     Returns:
         List formatted in the same way as the "current_rows" argument containing the new
             list of files
     """
-    new_paths = [Path(path) for path in json.loads(new_paths_json)]
-    new_rows = [{'filename': path.name, 'id': str(path)} for path in new_paths]
-    if current_rows:
-        for row in new_rows:
-            if row not in current_rows:
-                current_rows.append(row)
-
-        rows = sorted(current_rows, key=lambda row: row['filename'])
-        logger.info(f'New files list: {rows}')
-        return rows
-    rows = sorted(new_rows, key=lambda row: row['filename'])
+    new_rows = [
+        {
+            'filename': url_name(file['path'])
+            if is_url(file['path'])
+            else Path(file['path']).name,
+            'id': file['path'],
+            'sha256': file['sha256'],
+        }
+        for file in json.loads(new_files_json)
+    ]
+    rows = current_rows or []
+    # remote files without a known version have no digest and go by their url
+    keys = {row['sha256'] or row['id'] for row in rows}
+    for row in new_rows:
+        if (row['sha256'] or row['id']) not in keys:
+            keys.add(row['sha256'] or row['id'])
+            rows.append(row)
+    rows = sorted(rows, key=lambda row: row['filename'])
     logger.info(f'New files list: {rows}')
     return rows
 
 
-@callback(
-    Output(tdms_graph.id, 'figure'),
-    Output('figure_cache', 'data'),
-    Output('timestamp_store', 'data'),
-    Input(data_mgmt_canvas.id, 'is_open'),
-    State(file_list.id, 'data'),
-    State(primary_dropdown.id, 'value'),
-    State(secondary_dropdown.id, 'value'),
-)
-def on_data_canvas_close(
-    canvas_open: bool,
-    file_list_rows: list[dict] | None,
-    prim_channels: list[str] | None,
-    sec_channels: list[str] | None,
-) -> tuple[dict, FigureResampler, str] | type[no_update]:
-    """Processes tdms files and channels lists to create figure.
+def read_decoded(channel: 'nptdms.TdmsChannel', digest: str | None) -> np.ndarray:
+    """Reads the data of a tdms channel through the cache of decoded data.
 
-    This callback does the heavy lifting of reading the tdms files, aligning the
-    timestamps, building the polars dataframe, and plotting each individual trace
+    Decoded channels are saved as npy files under DECODED_PATH, keyed by the content
+    hash of the file they came from, so selecting the same channel again or uploading
+    the same file again skips decoding. Cached data is memory mapped when read back.
 
     Args:
-        canvas_open (bool): current state of data management canvas. Function will
-            immediately return if the canvas was just opened instead of closed.
-        file_list_rows (list[dict] | None): list of rows currently in the files list.
-            Each item has the format:
-                {
-                    'filename': <string containing just the filename>,
-                    'id': <string to full path of uploaded file>
-                }
-            Value of this argument can also sometimes be None if the element has not
-            been interacted with by the user yet
-        prim_channels (list[str]): list of channels in the primary axis dropdown menu.
-            Value of this argument can also sometimes be None if the element has not
-            been interacted with by the user yet
-        sec_channels (list[str]): list of channels in the secondary axis dropdown menu.
-            Value of this argument can also sometimes be None if the element has not
-            been interacted with by the user yet
+        channel (nptdms.TdmsChannel): the channel to read
+        digest (str | None): sha-256 hex digest of the tdms file, the cache is bypassed
+            if it isn't known
 
     Returns:
-        plotly.graph_objects.Figure: plotly figure object to populate the main panel of
-            the app when the data management canvas is closed
+        np.ndarray: the channel data
     """
-    # TODO: If people start using this for truly HUGE tdms files, it may becomes
-    # necessary to figure out a way for the dataframe to persist outside of the scope of
-    # this callback. This would allow this callback to essentially "cache" partial data
-    # and if a single channel is added or removed, all the other channels wouldn't have
-    # to be reloaded. I would consider duckdb for this, I think.
-    # TODO: integrate spinner
-    if canvas_open:
-        return no_update
-    logger.info('Data management canvas closed.')
-    if not (prim_channels or sec_channels):
-        logger.info('No data to plot, no channels selected.')
-        return no_update
-    if not file_list_rows:
-        logger.info('No data to plot, no files selected.')
-        return no_update
-    if prim_channels is None:
-        prim_channels = []
-    if sec_channels is None:
-        sec_channels = []
-    logger.info(f'Files selected: {file_list_rows}')
-    logger.info(f'Primary channels selected: {prim_channels}')
-    logger.info(f'Secondary channels selected: {sec_channels}')
-    tdms_paths = [Path(row['id']) for row in file_list_rows]
-    dfs = []
-    for tdms_path in tdms_paths:
-        with nptdms.TdmsFile.open(tdms_path) as tdms:
-            data_by_timestamp = {
-                timestamp.name: pl.DataFrame(
-                    # timestamp data
-                    {
-                        'datetime': pl.from_numpy(
-                            timestamp.read_data(), schema={'datetime': pl.Datetime}
-                        )
-                    }
-                    # union with another dictionary with the channel data
-                    | {
-                        # channel data
-                        # TODO: verify that this operation is only performed if the if
-                        # condition at the end of dict comprehension is True
-                        channel_name: pl.from_numpy(
-                            tdms['RTAC Data'][channel_name].read_data()
-                        )
-                        # for each unique channel name in the selected channels
-                        for channel_name in set(prim_channels + sec_channels)
-                        # but only if the channel is associated with the right timestamp
-                        if tdms['RTAC Data'][channel_name]
-                        .properties['Xaxis']
-                        .split('/')[1]
-                        == timestamp.name
-                    }
-                )  # .with_columns(filename=pl.lit(tdms_path.name))
-                # iterates over each timestamp in the file
-                for timestamp in tdms['TimeStamps'].channels()
-            }
+    if digest is None:
+        return channel.read_data()
+    cache_path = (
+        DECODED_PATH / digest / f'{hashlib.sha1(channel.path.encode()).hexdigest()}.npy'
+    )
+    if cache_path.is_file():
+        return np.load(cache_path, mmap_mode='r')
+    data = channel.read_data()
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # writing under a unique name first, since the batch workers share this cache
+    partial_fd, partial_name = tempfile.mkstemp(suffix='.part', dir=cache_path.parent)
+    with open(partial_fd, 'wb') as partial_file:
+        np.save(partial_file, data)
+    Path(partial_name).replace(cache_path)
+    return data
 
-        # Iteratively merging all dataframes based on datetime. The result of this is
-        # that all channels will have a common time axis, but channels with timestamps
-        # of lower acquisition frequency than the maximum in the tdms file will have
-        # blank values.
-        right = pl.DataFrame(schema={'datetime': pl.Datetime})
-        for left in data_by_timestamp.values():
-            right = right.join(left, on='datetime', how='full', coalesce=True)
-        dfs.append(right)
-    df: pl.DataFrame = pl.concat(dfs, how='diagonal_relaxed').sort('datetime')
-    first_timestamp = df['datetime'].min()
-    fdt = {
-        'fdt': first_timestamp.strftime('%Y%m%dT%H%M%S'),
-        'fd': first_timestamp.date().strftime('%Y%m%d'),
-        'ft': first_timestamp.time().strftime('T%H%M%S'),
-    }
 
-    fig = FigureResampler(make_subplots(specs=[[{'secondary_y': True}]]))
+def fill_placeholders(filename_raw: str, ts_dict: dict) -> str:
+    """Replaces the placeholders listed in the export canvas within a filename.
+
+    Args:
+        filename_raw (str): filename including any placeholders
+        ts_dict (dict): information about the earliest timestamp in the chart data, with
+            the 'fdt', 'fd' and 'ft' keys
+
+    Returns:
+        str: the filename with every placeholder replaced
+    """
+    now = dt.now()
+    return (
+        filename_raw.replace('<dt>', now.strftime('%Y%m%dT%H%M%S'))
+        .replace('<t>', now.time().strftime('T%H%M%S'))
+        .replace('<d>', now.date().strftime('%Y%m%d'))
+        .replace('<fdt>', ts_dict['fdt'])
+        .replace('<fd>', ts_dict['fd'])
+        .replace('<ft>', ts_dict['ft'])
+    )
+
+
+WORKSPACE_MAGIC = b'MODASHWS'
+# columns are aligned to this many bytes within the snapshot file
+WORKSPACE_ALIGNMENT = 64
+
+
+def align(offset: int) -> int:
+    """Rounds an offset within a snapshot file up to WORKSPACE_ALIGNMENT."""
+    return -(-offset // WORKSPACE_ALIGNMENT) * WORKSPACE_ALIGNMENT
+
+
+class SnapshotColumn(np.memmap):
+    """Column of a workspace snapshot, memory mapped straight from the snapshot file.
+
+    Pickles as a reference into the snapshot file instead of a copy of its data, so
+    putting a figure opened from a workspace into the server-side cache stays cheap.
+    This relies on snapshot files never being modified once written, see
+    write_workspace. Slices of a column are pickled like any other array.
+    """
+
+    def __reduce__(self):
+        if not isinstance(self.base, mmap.mmap):
+            return np.asarray(self).__reduce__()
+        # marks the snapshot as in use for clean_up_snapshots
+        try:
+            os.utime(self.filename)
+        except OSError:
+            pass
+        return (
+            SnapshotColumn,
+            (self.filename, self.dtype, 'r', self.offset, self.shape),
+        )
+
+
+def write_workspace(path: Path, header: dict, data: dict[str, np.ndarray]):
+    """Writes a workspace snapshot file and points the workspace at it.
+
+    Snapshot files are written once under a unique name in WORKSPACE_SNAPSHOTS_PATH and
+    never modified, since figures in the server-side cache memory map them. The
+    workspace file at path only holds the name of its snapshot, so saving a workspace
+    again under the same name leaves the previous snapshot intact.
+
+    A snapshot starts with WORKSPACE_MAGIC, followed by the length of the json header
+    as an 8 byte little-endian integer and the header itself. The raw data of each
+    column comes after that, aligned so it can be memory mapped, and described by the
+    'columns' entry of the header with offsets relative to the end of the header.
+
+    Args:
+        path (Path): the workspace file to write
+        header (dict): json serializable state of the workspace
+        data (dict[str, np.ndarray]): columns of aligned data
+    """
+    columns = []
+    offset = 0
+    for name, column in data.items():
+        columns.append(
+            {
+                'name': name,
+                'dtype': column.dtype.str,
+                'shape': list(column.shape),
+                'offset': offset,
+            }
+        )
+        offset = align(offset + column.nbytes)
+    header_bytes = json.dumps(header | {'columns': columns}).encode()
+    data_start = align(len(WORKSPACE_MAGIC) + 8 + len(header_bytes))
+
+    WORKSPACE_SNAPSHOTS_PATH.mkdir(exist_ok=True)
+    snapshot_path = WORKSPACE_SNAPSHOTS_PATH / f'{uuid.uuid4().hex}.snapshot'
+    partial_path = snapshot_path.with_name(snapshot_path.name + '.part')
+    with open(partial_path, 'wb') as snapshot:
+        snapshot.write(WORKSPACE_MAGIC)
+        snapshot.write(len(header_bytes).to_bytes(8, 'little'))
+        snapshot.write(header_bytes)
+        for column, values in zip(columns, data.values()):
+            snapshot.write(b'\0' * (data_start + column['offset'] - snapshot.tell()))
+            np.ascontiguousarray(values).tofile(snapshot)
+    partial_path.replace(snapshot_path)
+
+    partial_path = path.with_name(path.name + '.part')
+    partial_path.write_text(snapshot_path.name)
+    partial_path.replace(path)
+
+
+def workspace_snapshot(path: Path) -> Path:
+    """Returns the snapshot file a workspace file refers to.
+
+    Workspaces saved before snapshots got unique names are snapshot files themselves.
+
+    Args:
+        path (Path): the workspace file
+
+    Returns:
+        Path: the snapshot file
+    """
+    with open(path, 'rb') as workspace:
+        if workspace.read(len(WORKSPACE_MAGIC)) == WORKSPACE_MAGIC:
+            return path
+        workspace.seek(0)
+        snapshot_name = workspace.read().decode().strip()
+    if not re.fullmatch(r'[0-9a-f]{32}\.snapshot', snapshot_name):
+        raise ValueError(f'{path} is not a MoDash workspace')
+    return WORKSPACE_SNAPSHOTS_PATH / snapshot_name
+
+
+def read_workspace(path: Path) -> tuple[dict, dict[str, SnapshotColumn]]:
+    """Opens a workspace written by write_workspace.
+
+    None of the column data is read, the columns are only memory mapped.
+
+    Args:
+        path (Path): the workspace file
+
+    Returns:
+        tuple of length 2:
+            dict: the json header with the state of the workspace
+            dict[str, SnapshotColumn]: the memory mapped columns of aligned data
+    """
+    snapshot_path = workspace_snapshot(path)
+    with open(snapshot_path, 'rb') as snapshot:
+        if snapshot.read(len(WORKSPACE_MAGIC)) != WORKSPACE_MAGIC:
+            raise ValueError(f'{path} is not a MoDash workspace')
+        header_size = int.from_bytes(snapshot.read(8), 'little')
+        header = json.loads(snapshot.read(header_size))
+    data_start = align(len(WORKSPACE_MAGIC) + 8 + header_size)
+    data = {
+        column['name']: SnapshotColumn(
+            snapshot_path,
+            dtype=np.dtype(column['dtype']),
+            mode='r',
+            offset=data_start + column['offset'],
+            shape=tuple(column['shape']),
+        )
+        for column in header.pop('columns')
+    }
+    return header, data
+
+
+def merge_relayout(relayout_state: dict | None, relayout_data: dict) -> dict:
+    """Merges a relayout event into the accumulated relayout state of the graph.
+
+    Args:
+        relayout_state (dict | None): flat relayout data accumulated so far
+        relayout_data (dict): flat relayout data of the latest event
+
+    Returns:
+        dict: relayout data which restores the view of the graph when applied at once
+    """
+    relayout_state = dict(relayout_state or {})
+    for key, value in relayout_data.items():
+        axis, _, prop = key.partition('.')
+        # a range and an autorange for the same axis cancel each other out
+        if prop == 'autorange':
+            stale = f'{axis}.range'
+        elif prop.startswith('range'):
+            stale = f'{axis}.autorange'
+        else:
+            stale = None
+        if stale is not None:
+            for stale_key in [k for k in relayout_state if k.startswith(stale)]:
+                del relayout_state[stale_key]
+        relayout_state[key] = value
+    return relayout_state
+
+
+def visible_window(
+    relayout_state: dict | None,
+) -> tuple[np.datetime64 | None, np.datetime64 | None]:
+    """Finds the x-range of the graph from its accumulated relayout data.
+
+    Args:
+        relayout_state (dict | None): accumulated layout and zoom changes of the graph,
+            as kept by merge_relayout
+
+    Returns:
+        tuple[np.datetime64 | None, np.datetime64 | None]: start and end of the visible
+            window, None for either meaning the graph isn't zoomed in on that side
+    """
+    relayout_state = relayout_state or {}
+    bounds = relayout_state.get('xaxis.range') or [
+        relayout_state.get('xaxis.range[0]'),
+        relayout_state.get('xaxis.range[1]'),
+    ]
+    # plotly sends dates like '2025-01-01 00:00:10.5'
+    return tuple(
+        None if bound is None else np.datetime64(str(bound).replace(' ', 'T'), 'us')
+        for bound in bounds
+    )
+
+
+def read_groups(
+    tdms_path: Path | str, digest: str | None, channels: set[str]
+) -> dict[str, 'pl.DataFrame']:
+    """Reads the selected channels of a tdms file, grouped by their timestamps.
+
+    Args:
+        tdms_path (Path | str): path of the tdms file, or the url of a remote one
+        digest (str | None): sha-256 hex digest of the file contents, if known, for the
+            decoded data cache. Remote files are keyed by their url and version instead,
+            and aren't cached if the server doesn't identify the version
+        channels (set[str]): names of the channels to read
+
+    Returns:
+        dict[str, pl.DataFrame]: for each timestamp channel of the file, a 'datetime'
+            column followed by the selected channels recorded at those timestamps
+    """
+    import nptdms
+    import polars as pl
+
+    if is_url(tdms_path):
+        tdms_path = RemoteFile(tdms_path)
+        digest = tdms_path.digest
+    with nptdms.TdmsFile.open(tdms_path) as tdms:
+        return {
+            timestamp.name: pl.DataFrame(
+                # timestamp data
+                {
+                    'datetime': pl.from_numpy(
+                        read_decoded(timestamp, digest),
+                        schema={'datetime': pl.Datetime},
+                    )
+                }
+                # union with another dictionary with the channel data
+                | {
+                    # channel data
+                    # TODO: verify that this operation is only performed if the if
+                    # condition at the end of dict comprehension is True
+                    channel_name: pl.from_numpy(
+                        read_decoded(tdms['RTAC Data'][channel_name], digest)
+                    )
+                    # for each unique channel name in the selected channels
+                    for channel_name in channels
+                    # but only if the channel is associated with the right timestamp
+                    if tdms['RTAC Data'][channel_name].properties['Xaxis'].split('/')[1]
+                    == timestamp.name
+                }
+            )  # .with_columns(filename=pl.lit(tdms_path.name))
+            # iterates over each timestamp in the file
+            for timestamp in tdms['TimeStamps'].channels()
+        }
+
+
+def join_groups(groups: list['pl.DataFrame']) -> 'pl.DataFrame':
+    """Merges timestamp groups into one dataframe with a common time axis.
+
+    Channels with timestamps of lower acquisition frequency than the fastest group will
+    have blank values in between their own timestamps.
+
+    Args:
+        groups (list[pl.DataFrame]): dataframes with a 'datetime' column each
+
+    Returns:
+        pl.DataFrame: the union of the groups, joined on datetime
+    """
+    import polars as pl
+
+    right = pl.DataFrame(schema={'datetime': pl.Datetime})
+    for left in groups:
+        right = right.join(left, on='datetime', how='full', coalesce=True)
+    return right
+
+
+def load_data(
+    files: list[tuple[Path | str, str | None]], channels: set[str]
+) -> 'pl.DataFrame':
+    """Reads the selected channels from tdms files and aligns them on one time axis.
+
+    Args:
+        files (list[tuple[Path | str, str | None]]): path or url of each tdms file
+            along with the sha-256 hex digest of its contents, if known, for the
+            decoded data cache
+        channels (set[str]): names of the channels to read from every file
+
+    Returns:
+        pl.DataFrame: aligned data with a 'datetime' column and one column per channel,
+            sorted by datetime
+    """
+    import polars as pl
+
+    dfs = [
+        join_groups(read_groups(tdms_path, digest, channels).values())
+        for tdms_path, digest in files
+    ]
+    return pl.concat(dfs, how='diagonal_relaxed').sort('datetime')
+
+
+def load_groups(
+    files: list[tuple[Path | str, str | None]], channels: set[str]
+) -> dict[str, 'pl.DataFrame']:
+    """Reads the selected channels from tdms files, keeping their own time axes.
+
+    Unlike load_data, the timestamp groups aren't joined, so no channel gets padded
+    with blanks up to the time axis of the fastest group. Groups without any selected
+    channel are left out.
+
+    Args:
+        files (list[tuple[Path | str, str | None]]): path or url of each tdms file
+            along with the sha-256 hex digest of its contents, if known, for the
+            decoded data cache
+        channels (set[str]): names of the channels to read from every file
+
+    Returns:
+        dict[str, pl.DataFrame]: for each timestamp group, a 'datetime' column and one
+            column per channel of the group, concatenated across the files and sorted
+            by datetime
+    """
+    import polars as pl
+
+    groups = {}
+    for tdms_path, digest in files:
+        for name, df in read_groups(tdms_path, digest, channels).items():
+            if df.width > 1:
+                groups.setdefault(name, []).append(df)
+    return {
+        name: pl.concat(dfs, how='diagonal_relaxed').sort('datetime')
+        for name, dfs in groups.items()
+    }
+
+
+def compact_channel(values: np.ndarray) -> np.ndarray:
+    """Downcasts float64 channel data to float32 if the difference can't be seen.
+
+    The downcast is kept only if no value overflows and the largest rounding error is
+    within COMPACT_TOLERANCE of the range of the channel, i.e. far below a pixel even
+    when zoomed in on the y-axis a thousandfold. Other dtypes are returned as is.
+
+    Args:
+        values (np.ndarray): data of one channel
+
+    Returns:
+        np.ndarray: float32 copy of the data, or the data itself
+    """
+    if values.dtype != np.float64:
+        return values
+    with np.errstate(over='ignore'):
+        compact = values.astype(np.float32)
+    finite = np.isfinite(values)
+    if not finite.any():
+        return compact
+    if not np.isfinite(compact[finite]).all():
+        return values
+    error = np.abs(compact[finite] - values[finite]).max()
+    scale = np.ptp(values[finite]) or np.abs(values[finite]).max()
+    return compact if error <= COMPACT_TOLERANCE * scale else values
+
+
+def aligned_traces(df: 'pl.DataFrame') -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """Splits aligned data into the timestamps and values of every channel.
+
+    Args:
+        df (pl.DataFrame): aligned data with a 'datetime' column
+
+    Returns:
+        dict[str, tuple[np.ndarray, np.ndarray]]: timestamps and values of each
+            channel, all channels sharing the same timestamps array
+    """
+    timestamps = df['datetime'].to_numpy()
+    return {
+        column: (timestamps, df[column].to_numpy())
+        for column in df.columns
+        if column != 'datetime'
+    }
+
+
+def compact_traces(
+    groups: dict[str, 'pl.DataFrame'],
+) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """Splits timestamp groups into the timestamps and compacted values of channels.
+
+    Args:
+        groups (dict[str, pl.DataFrame]): timestamp groups as returned by load_groups
+
+    Returns:
+        dict[str, tuple[np.ndarray, np.ndarray]]: timestamps and values of each
+            channel, the channels of a group sharing the same timestamps array and the
+            values being downcast by compact_channel
+    """
+    traces = {}
+    for df in groups.values():
+        timestamps = df['datetime'].to_numpy()
+        for column in df.columns:
+            if column != 'datetime':
+                traces[column] = (timestamps, compact_channel(df[column].to_numpy()))
+    return traces
+
+
+def timestamp_info(first_timestamp: dt) -> dict:
+    """Formats the earliest timestamp in the data for the filename placeholders.
+
+    Args:
+        first_timestamp (datetime): earliest timestamp of the plotted data
+
+    Returns:
+        dict: the 'fdt', 'fd' and 'ft' strings used by fill_placeholders
+    """
+    return {
+        'fdt': first_timestamp.strftime('%Y%m%dT%H%M%S'),
+        'fd': first_timestamp.date().strftime('%Y%m%d'),
+        'ft': first_timestamp.time().strftime('T%H%M%S'),
+    }
+
+
+def build_figure(
+    traces: dict[str, tuple[np.ndarray, np.ndarray]], axes_channels: list[list[str]]
+) -> 'ParallelFigureResampler':
+    """Builds the resampled figure with one y-axis per list of channels.
+
+    The first axis sits on the left and the second on the right, both anchored to the
+    x-axis. Any further axes overlay the first one and alternate between the left and
+    right sides, automatically shifted outwards so they don't overlap.
+
+    Channels sharing the same timestamps array also share the same time index in the
+    figure, so the timestamps are held once instead of once per trace.
+
+    Args:
+        traces (dict[str, tuple[np.ndarray, np.ndarray]]): timestamps and values of
+            each selected channel
+        axes_channels (list[list[str]]): channels to plot on each y-axis, the first
+            list being the primary axis
+
+    Returns:
+        ParallelFigureResampler: figure with one resampled trace per channel
+    """
+    from resampling import ParallelFigureResampler, shared_time_index
+
+    spikes = {
+        'spikemode': 'across',
+        'spikesnap': 'cursor',
+        'spikethickness': 0.5,
+        'spikecolor': 'black',
+    }
+    # every axis past the first two is shifted outwards, so the margins grow with them
+    n_left = sum(1 for index in range(len(axes_channels)) if index % 2 == 0)
+    n_right = len(axes_channels) - n_left
+    fig = ParallelFigureResampler(go.Figure())
     fig.update_layout(
-        margin={'r': 0, 'l': 50, 't': 30, 'b': 125},
+        margin={
+            'r': 60 * max(n_right - 1, 0),
+            'l': 50 + 60 * max(n_left - 1, 0),
+            't': 30,
+            'b': 125,
+        },
         legend={
             'orientation': 'v',
             'x': 0.01,
@@ -617,22 +1606,25 @@ def on_data_canvas_close(
             'spikethickness': 1,
             'spikecolor': 'black',
         },
-        yaxis={
-            'spikemode': 'across',
-            'spikesnap': 'cursor',
-            'spikethickness': 0.5,
-            'spikecolor': 'black',
-        },
-        yaxis2={
-            'spikemode': 'across',
-            'spikesnap': 'cursor',
-            'spikethickness': 0.5,
-            'spikecolor': 'black',
-            'tickmode': 'sync',
-        },
+        yaxis=spikes,
     )
-    for channels, secondary_y in [(prim_channels, False), (sec_channels, True)]:
+    for index in range(1, len(axes_channels)):
+        side = 'left' if index % 2 == 0 else 'right'
+        yaxis = spikes | {'overlaying': 'y', 'side': side, 'tickmode': 'sync'}
+        if index > 1:
+            yaxis |= {
+                'anchor': 'free',
+                'autoshift': True,
+                'position': 0 if side == 'left' else 1,
+            }
+        fig.update_layout({f'yaxis{index + 1}': yaxis})
+    time_indexes = {}
+    for index, channels in enumerate(axes_channels):
+        suffix = axis_name(index).removesuffix(' Axis').lower()
         for channel in channels:
+            timestamps, values = traces[channel]
+            if id(timestamps) not in time_indexes:
+                time_indexes[id(timestamps)] = shared_time_index(timestamps)
             fig.add_trace(
                 go.Scattergl(
                     # Converting all these to lists because if they remain as polars
@@ -644,16 +1636,109 @@ def on_data_canvas_close(
                     # x=df['datetime'].to_list(),
                     # y=df[channel].to_list(),
                     mode='lines',
-                    name=channel + (' (secondary)' if secondary_y else ' (primary)'),
+                    name=f'{channel} ({suffix})',
                     connectgaps=True,
                     showlegend=True,
+                    yaxis=f'y{index + 1}' if index else 'y',
+                    meta=channel,
                 ),
-                secondary_y=secondary_y,
-                hf_x=df['datetime'].to_numpy(),
-                hf_y=df[channel].to_numpy(),
+                hf_x=time_indexes[id(timestamps)],
+                hf_y=values,
                 max_n_samples=3000,
             )
-    return fig, Serverside(fig), json.dumps(fdt)
+    return fig
+
+
+@callback(
+    Output(tdms_graph.id, 'figure'),
+    Output('figure_cache', 'data'),
+    Output('timestamp_store', 'data'),
+    Output('relayout_store', 'data', allow_duplicate=True),
+    Input(data_mgmt_canvas.id, 'is_open'),
+    State(file_list.id, 'data'),
+    State({'type': 'axis_dropdown', 'index': ALL}, 'value'),
+    State(compact_switch.id, 'value'),
+)
+def on_data_canvas_close(
+    canvas_open: bool,
+    file_list_rows: list[dict] | None,
+    axes_channels: list[list[str] | None],
+    compact: bool,
+) -> tuple[dict, 'ParallelFigureResampler', str, dict] | type[no_update]:
+    """Processes tdms files and channels lists to create figure.
+
+    This callback does the heavy lifting of reading the tdms files, aligning the
+    timestamps, building the polars dataframe, and plotting each individual trace
+
+    Args:
+        canvas_open (bool): current state of data management canvas. Function will
+            immediately return if the canvas was just opened instead of closed.
+        file_list_rows (list[dict] | None): list of rows currently in the files list.
+            Each item has the format:
+                {
+                    'filename': <string containing just the filename>,
+                    'id': <string to full path of uploaded file>
+                }
+            Value of this argument can also sometimes be None if the element has not
+            been interacted with by the user yet
+        axes_channels (list[list[str] | None]): list of channels in each axis dropdown
+            menu, starting with the primary axis. Each item can also sometimes be None
+            if the dropdown has not been interacted with by the user yet
+        compact (bool): whether compact memory mode is on, in which case every
+            timestamp group keeps its own time axis and channels are downcast to
+            float32 where that can't be seen
+
+    Returns:
+        plotly.graph_objects.Figure: plotly figure object to populate the main panel of
+            the app when the data management canvas is closed
+    """
+    # TODO: If people start using this for truly HUGE tdms files, it may becomes
+    # necessary to figure out a way for the dataframe to persist outside of the scope of
+    # this callback. This would allow this callback to essentially "cache" partial data
+    # and if a single channel is added or removed, all the other channels wouldn't have
+    # to be reloaded. I would consider duckdb for this, I think.
+    # TODO: integrate spinner
+    if canvas_open:
+        return no_update
+    logger.info('Data management canvas closed.')
+    axes_channels = [channels or [] for channels in axes_channels]
+    if not any(axes_channels):
+        logger.info('No data to plot, no channels selected.')
+        return no_update
+    if not file_list_rows:
+        logger.info('No data to plot, no files selected.')
+        return no_update
+    missing_paths = [
+        row['id']
+        for row in file_list_rows
+        if not is_url(row['id']) and not Path(row['id']).exists()
+    ]
+    if missing_paths:
+        logger.info(f'Not replotting, files no longer available: {missing_paths}')
+        return no_update
+    # trailing axes without any channels would only show up as empty axes
+    while not axes_channels[-1]:
+        axes_channels.pop()
+    logger.info(f'Files selected: {file_list_rows}')
+    for index, channels in enumerate(axes_channels):
+        logger.info(f'{axis_name(index)} channels selected: {channels}')
+    files = [
+        (row['id'] if is_url(row['id']) else Path(row['id']), row.get('sha256'))
+        for row in file_list_rows
+    ]
+    channels = set(chain.from_iterable(axes_channels))
+    if compact:
+        groups = load_groups(files, channels)
+        traces = compact_traces(groups)
+        first_timestamp = min(df['datetime'].min() for df in groups.values())
+    else:
+        df = load_data(files, channels)
+        traces = aligned_traces(df)
+        first_timestamp = df['datetime'].min()
+    fdt = timestamp_info(first_timestamp)
+
+    fig = build_figure(traces, axes_channels)
+    return fig, Serverside(fig), json.dumps(fdt), {}
 
 
 @callback(
@@ -663,13 +1748,287 @@ def on_data_canvas_close(
     prevent_initial_call=True,
     memoize=True,
 )
-def resample_fig(relayoutdata: dict, fig: FigureResampler):
+def resample_fig(relayoutdata: dict, fig: 'ParallelFigureResampler'):
     """Just handles resampling the figure data when it's zoomed or panned."""
     if fig is None:
         return no_update
     return fig.construct_update_data_patch(relayoutdata)
 
 
+@callback(
+    Output('relayout_store', 'data'),
+    Input(tdms_graph.id, 'relayoutData'),
+    State('relayout_store', 'data'),
+    prevent_initial_call=True,
+)
+def on_relayout(relayoutdata: dict | None, relayout_state: dict | None) -> dict:
+    """Accumulates the layout and zoom changes made to the graph for workspaces."""
+    if not relayoutdata:
+        return no_update
+    return merge_relayout(relayout_state, relayoutdata)
+
+
+@callback(
+    Output(workspace_canvas.id, 'is_open'),
+    Output(workspace_dropdown.id, 'options'),
+    Input(workspace_canvas_button.id, 'n_clicks'),
+    State(workspace_canvas.id, 'is_open'),
+    prevent_initial_call=True,
+)
+def toggle_workspace_canvas(
+    n_clicks: int,
+    is_open: bool,
+):
+    """Callback to open workspace canvas if it is closed.
+
+    Args:
+        n_clicks (int): number of times the workspaces button has been clicked
+        is_open (bool): whether or not the workspace canvas is open
+
+    Returns:
+        tuple of length 2:
+            bool: indicates new status of workspace canvas
+            list[str]: names of the saved workspaces, newest first
+        no_update: will return without updating status of outputs
+    """
+    logger.info('Workspace canvas opened.')
+    if n_clicks:
+        workspaces = sorted(
+            WORKSPACE_PATH.glob('*.modash'),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True,
+        )
+        return not is_open, [path.stem for path in workspaces]
+    return no_update
+
+
+@callback(
+    Output('workspace_status', 'children'),
+    Input(save_workspace_button.id, 'n_clicks'),
+    State(workspace_name_input.id, 'value'),
+    State('figure_cache', 'data'),
+    State(file_list.id, 'data'),
+    State('relayout_store', 'data'),
+    State('timestamp_store', 'data'),
+    prevent_initial_call=True,
+)
+def on_save_workspace(
+    _,
+    name_raw: str | None,
+    fig: 'ParallelFigureResampler | None',
+    file_list_rows: list[dict] | None,
+    relayout_state: dict | None,
+    ts_json: str | None,
+) -> str:
+    """Saves the current workspace to a snapshot file in WORKSPACE_PATH.
+
+    The plotted data is taken from the full resolution data held by the cached figure,
+    so nothing is read from the tdms files.
+
+    Args:
+        name_raw (str | None): name the user entered for the workspace, including any
+            placeholders
+        fig (ParallelFigureResampler | None): cached resampled figure object
+        file_list_rows (list[dict] | None): rows currently in the files list
+        relayout_state (dict | None): accumulated layout and zoom changes of the graph
+        ts_json (str | None): json formatted string containing information about the
+            earliest timestamp in the chart data
+
+    Returns:
+        str: status message to show in the workspace canvas
+    """
+    logger.info('Save workspace button clicked.')
+    if fig is None:
+        return 'Nothing to save yet, close the data management panel to plot first.'
+    ts_dict = json.loads(ts_json)
+    name = safe_name(fill_placeholders(name_raw or 'MoDash-<fdt>', ts_dict))
+    axes_channels = []
+    data = {}
+    timestamp_columns = {}
+    # timestamps shared by several traces are saved once, keyed by their memory
+    timestamp_names = {}
+    # hf_data holds the full resolution data of the traces, in the same order
+    for trace, hf_trace in zip(fig.data, fig.hf_data):
+        index = int(trace.yaxis[1:] or 1) - 1
+        while len(axes_channels) <= index:
+            axes_channels.append([])
+        axes_channels[index].append(trace.meta)
+        timestamps = np.asarray(hf_trace['x'])
+        key = (timestamps.__array_interface__['data'][0], len(timestamps))
+        if key not in timestamp_names:
+            timestamp_names[key] = f'datetime{len(timestamp_names) or ""}'
+            data[timestamp_names[key]] = timestamps
+        timestamp_columns[trace.meta] = timestamp_names[key]
+        data[trace.meta] = hf_trace['y']
+    header = {
+        'version': 2,
+        'files': file_list_rows or [],
+        'axes_channels': axes_channels,
+        'timestamp_columns': timestamp_columns,
+        'relayout': relayout_state or {},
+        'timestamps': ts_dict,
+    }
+    path = WORKSPACE_PATH / f'{name}.modash'
+    write_workspace(path, header, data)
+    logger.info(f'Workspace saved to {path}.')
+    return f'Saved workspace "{name}".'
+
+
+@callback(
+    Output(tdms_graph.id, 'figure', allow_duplicate=True),
+    Output('figure_cache', 'data', allow_duplicate=True),
+    Output('timestamp_store', 'data', allow_duplicate=True),
+    Output('relayout_store', 'data', allow_duplicate=True),
+    Output(file_list.id, 'data', allow_duplicate=True),
+    Output('axis_selections', 'children', allow_duplicate=True),
+    Output('channels_store', 'data', allow_duplicate=True),
+    Input(open_workspace_button.id, 'n_clicks'),
+    State(workspace_dropdown.id, 'value'),
+    prevent_initial_call=True,
+)
+def on_open_workspace(_, name: str | None):
+    """Opens a saved workspace and renders it straight from its snapshot file.
+
+    The columns of the snapshot are memory mapped, so only the parts needed to resample
+    the saved view are actually read, and the tdms files aren't touched at all.
+
+    Args:
+        name (str | None): name of the selected workspace
+
+    Returns:
+        tuple of length 7: the figure, the figure to cache server-side, the timestamp
+            information, the accumulated layout changes, the file list rows, the axis
+            selection blocks and the channels to offer in the axis dropdowns
+    """
+    logger.info(f'Opening workspace {name}.')
+    if not name:
+        return no_update
+    header, data = read_workspace(WORKSPACE_PATH / f'{name}.modash')
+    # version 1 snapshots have a single 'datetime' column shared by all channels
+    timestamp_columns = header.get('timestamp_columns', {})
+    traces = {
+        channel: (data[timestamp_columns.get(channel, 'datetime')], data[channel])
+        for channel in chain.from_iterable(header['axes_channels'])
+    }
+    fig = build_figure(traces, header['axes_channels'])
+    if header['relayout']:
+        fig.apply_relayout(header['relayout'])
+    channels = sorted(set(chain.from_iterable(header['axes_channels'])))
+    axes_channels = header['axes_channels'] + [[]] * (2 - len(header['axes_channels']))
+    return (
+        fig,
+        Serverside(fig),
+        json.dumps(header['timestamps']),
+        header['relayout'],
+        header['files'],
+        [
+            axis_selection(index, channels, axis_channels)
+            for index, axis_channels in enumerate(axes_channels)
+        ],
+        channels,
+    )
+
+
+@callback(
+    Output(spectrum_canvas.id, 'is_open'),
+    Output(spectrum_channels_dropdown.id, 'options'),
+    Input(spectrum_canvas_button.id, 'n_clicks'),
+    State(spectrum_canvas.id, 'is_open'),
+    State('figure_cache', 'data'),
+    prevent_initial_call=True,
+)
+def toggle_spectrum_canvas(
+    n_clicks: int,
+    is_open: bool,
+    fig: 'ParallelFigureResampler | None',
+):
+    """Callback to open spectrum canvas if it is closed.
+
+    Args:
+        n_clicks (int): number of times the spectrum button has been clicked
+        is_open (bool): whether or not the spectrum canvas is open
+        fig (ParallelFigureResampler | None): cached resampled figure object
+
+    Returns:
+        tuple of length 2:
+            bool: indicates new status of spectrum canvas
+            list[str]: plotted channels to offer in the channels dropdown
+        no_update: will return without updating status of outputs
+    """
+    logger.info('Spectrum canvas opened.')
+    if n_clicks:
+        channels = [] if fig is None else [trace.meta for trace in fig.data]
+        return not is_open, channels
+    return no_update
+
+
+@callback(
+    Output(spectrum_graph.id, 'figure'),
+    Input(spectrum_canvas.id, 'is_open'),
+    Input(spectrum_channels_dropdown.id, 'value'),
+    Input(spectrum_method_radio.id, 'value'),
+    Input(spectrum_nperseg_dropdown.id, 'value'),
+    Input('relayout_store', 'data'),
+    State('figure_cache', 'data'),
+    prevent_initial_call=True,
+)
+def on_spectrum(
+    canvas_open: bool,
+    channels: list[str] | None,
+    method: str,
+    nperseg: int,
+    relayout_state: dict | None,
+    fig: 'ParallelFigureResampler | None',
+) -> go.Figure:
+    """Plots the spectrum of the selected channels over the visible x-range.
+
+    The spectra are computed from the full resolution data held by the cached figure,
+    not the resampled points shown in the graph, and are cached by trace, window and
+    parameters so going back to a previous view or method is instant.
+
+    Args:
+        canvas_open (bool): current state of the spectrum canvas. Nothing is computed
+            while it is closed
+        channels (list[str] | None): channels selected in the spectrum canvas
+        method (str): 'psd' for a Welch power spectral density or 'fft' for an
+            amplitude spectrum
+        nperseg (int): number of samples per segment of the Welch method
+        relayout_state (dict | None): accumulated layout and zoom changes of the graph
+        fig (ParallelFigureResampler | None): cached resampled figure object
+
+    Returns:
+        plotly.graph_objects.Figure: spectra of the selected channels
+    """
+    from spectral import cached_window_spectrum
+
+    if not canvas_open or not channels or fig is None:
+        return no_update
+    start, stop = visible_window(relayout_state)
+    logger.info(f'Computing {method} of {channels} between {start} and {stop}.')
+    spectrum_fig = go.Figure()
+    spectrum_fig.update_layout(
+        margin={'l': 60, 'r': 10, 't': 10, 'b': 40},
+        xaxis={'title': 'Frequency (Hz)'},
+        yaxis={
+            'title': 'PSD (unit²/Hz)' if method == 'psd' else 'Amplitude',
+            'type': 'log',
+            'exponentformat': 'power',
+        },
+        legend={'x': 0.99, 'y': 0.99, 'xanchor': 'right', 'yanchor': 'top'},
+    )
+    # hf_data holds the full resolution data of the traces, in the same order
+    for trace, hf_trace in zip(fig.data, fig.hf_data):
+        if trace.meta not in channels:
+            continue
+        freqs, spectrum = cached_window_spectrum(
+            (trace.uid,), hf_trace['x'], hf_trace['y'], start, stop, method, nperseg
+        )
+        spectrum_fig.add_trace(
+            go.Scattergl(x=freqs, y=spectrum, mode='lines', name=trace.meta)
+        )
+    return spectrum_fig
+
+
 @callback(Input(new_tab_button.id, 'n_clicks'))
 def on_new_tab(_):
     """Opens new browser tab and increments client count."""
@@ -691,7 +2050,7 @@ def on_new_tab(_):
 )
 def on_export_interactive(
     _,
-    fig: FigureResampler,
+    fig: 'ParallelFigureResampler',
     filename_raw: str,
     plotlyjs_select: str,
     ts_json: str,
@@ -699,7 +2058,7 @@ def on_export_interactive(
     """Passes current figure html as dictionary to download component.
 
     Args:
-        fig (FigureResampler): cached resampled figure object
+        fig (ParallelFigureResampler): cached resampled figure object
         filename_raw (str): string user has entered into the filename input box,
             including any placeholders
         plotlyjs_select (str): selection user has made with the plotlyjs radio buttons
@@ -712,16 +2071,7 @@ def on_export_interactive(
     """
     logger.info('Export interactive button clicked.')
     plotlyjs = True if plotlyjs_select == 'include' else plotlyjs_select
-    now = dt.now()
-    ts_dict = json.loads(ts_json)
-    filename = (
-        filename_raw.replace('<dt>', now.strftime('%Y%m%dT%H%M%S'))
-        .replace('<t>', now.time().strftime('T%H%M%S'))
-        .replace('<d>', now.date().strftime('%Y%m%d'))
-        .replace('<fdt>', ts_dict['fdt'])
-        .replace('<fd>', ts_dict['fd'])
-        .replace('<ft>', ts_dict['ft'])
-    ) + '.html'
+    filename = fill_placeholders(filename_raw, json.loads(ts_json)) + '.html'
     return dcc.send_string(
         fig.to_html(include_plotlyjs=plotlyjs),
         filename=filename,
@@ -750,7 +2100,7 @@ def on_export_image(
     """Passes current figure image as dictionary to download component.
 
     Args:
-        fig (FigureResampler): cached resampled figure object
+        fig (ParallelFigureResampler): cached resampled figure object
         filename_raw (str): string user has entered into the filename input box,
             including any placeholders
         ts_json (str): json formatted string containing information about the earliest
@@ -765,16 +2115,7 @@ def on_export_image(
             plotly figure image representation.
     """
     logger.info('Export interactive button clicked.')
-    now = dt.now()
-    ts_dict = json.loads(ts_json)
-    filename = (
-        filename_raw.replace('<dt>', now.strftime('%Y%m%dT%H%M%S'))
-        .replace('<t>', now.time().strftime('T%H%M%S'))
-        .replace('<d>', now.date().strftime('%Y%m%d'))
-        .replace('<fdt>', ts_dict['fdt'])
-        .replace('<fd>', ts_dict['fd'])
-        .replace('<ft>', ts_dict['ft'])
-    ) + '.png'
+    filename = fill_placeholders(filename_raw, json.loads(ts_json)) + '.png'
     return dcc.send_bytes(
         go.Figure(fig_dict).to_image(
             format='png', width=image_width, height=image_height
@@ -823,8 +2164,213 @@ def open_first_tab():
     logger.info(f'Active clients: {active_clients}')
 
 
+def file_digest(path: Path) -> str:
+    """Returns the sha-256 hex digest of a file, the key of its decoded data cache."""
+    with open(path, 'rb') as file:
+        return hashlib.file_digest(file, 'sha256').hexdigest()
+
+
+def render_run(
+    tdms_paths: list[str],
+    axes_channels: list[list[str]],
+    output_dir: str,
+    filename_raw: str,
+    formats: list[str],
+    width: int,
+    height: int,
+    plotlyjs: str,
+    compact: bool = False,
+) -> list[str]:
+    """Renders the outputs of one batch run.
+
+    This is the headless equivalent of closing the data management canvas and then
+    exporting the plot.
+
+    Args:
+        tdms_paths (list[str]): paths or urls of the tdms files plotted together in
+            this run
+        axes_channels (list[list[str]]): channels to plot on each y-axis, the first
+            list being the primary axis
+        output_dir (str): directory to write the outputs to
+        filename_raw (str): filename of the outputs without extension, including any
+            placeholders. Besides the export placeholders, <fn> stands for the name of
+            the first tdms file of the run
+        formats (list[str]): any of 'png', 'html' and 'parquet'
+        width (int): width in pixels of png outputs
+        height (int): height in pixels of png outputs
+        plotlyjs (str): how html outputs include the plotly javascript, same choices as
+            the plotly javascript radio buttons of the export canvas
+        compact (bool): whether to plot the data in compact memory mode. Parquet
+            outputs are aligned and at full precision either way
+
+    Returns:
+        list[str]: paths of the outputs written
+    """
+    files = [
+        (path, None) if is_url(path) else (Path(path), file_digest(Path(path)))
+        for path in tdms_paths
+    ]
+    channels = set(chain.from_iterable(axes_channels))
+    if compact:
+        groups = load_groups(files, channels)
+        traces = compact_traces(groups)
+        df = join_groups(list(groups.values())).sort('datetime')
+    else:
+        df = load_data(files, channels)
+        traces = aligned_traces(df)
+    # <fn> is only available in batch mode, since every run needs its own filename
+    filename = fill_placeholders(
+        filename_raw.replace(
+            '<fn>',
+            Path(
+                url_name(tdms_paths[0]) if is_url(tdms_paths[0]) else tdms_paths[0]
+            ).stem,
+        ),
+        timestamp_info(df['datetime'].min()),
+    )
+    output_path = Path(output_dir) / filename
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    outputs = []
+    if 'parquet' in formats:
+        df.write_parquet(output_path.with_suffix('.parquet'))
+        outputs.append(output_path.with_suffix('.parquet'))
+    if 'png' in formats or 'html' in formats:
+        fig = build_figure(traces, axes_channels)
+        if 'html' in formats:
+            fig.write_html(
+                output_path.with_suffix('.html'),
+                include_plotlyjs=True if plotlyjs == 'include' else plotlyjs,
+            )
+            outputs.append(output_path.with_suffix('.html'))
+        if 'png' in formats:
+            fig.write_image(
+                output_path.with_suffix('.png'),
+                format='png',
+                width=width,
+                height=height,
+            )
+            outputs.append(output_path.with_suffix('.png'))
+    return [str(path) for path in outputs]
+
+
+def run_batch(argv: list[str]):
+    """Headless batch rendering of many tdms files, see "python modash.py batch -h".
+
+    Every file matched by the globs is its own run unless --combine is given, in which
+    case they are all plotted together like files added to the same files list. Runs
+    are spread across a process pool, and the workers share the decoded data cache, so
+    channels already decoded by the app or a previous batch are not decoded again.
+
+    Args:
+        argv (list[str]): command line arguments following "batch"
+    """
+    parser = argparse.ArgumentParser(
+        prog='modash.py batch',
+        description='Render plots of tdms files without the browser interface.',
+    )
+    parser.add_argument(
+        'globs',
+        nargs='+',
+        help='tdms files to plot, wildcards are allowed. http(s) urls of remote files '
+        'are read with range requests',
+    )
+    parser.add_argument(
+        '-a',
+        '--axis',
+        nargs='+',
+        action='append',
+        required=True,
+        metavar='CHANNEL',
+        help='channels to plot on a y-axis, repeat for the secondary axis and more',
+    )
+    parser.add_argument(
+        '-f',
+        '--formats',
+        nargs='+',
+        choices=['png', 'html', 'parquet'],
+        default=['png'],
+    )
+    parser.add_argument('-o', '--output-dir', default='.')
+    parser.add_argument(
+        '-n',
+        '--filename',
+        default='<fn>-<fdt>',
+        help='output filename without extension. The export placeholders are allowed, '
+        'as well as <fn> for the name of the (first) tdms file of each run',
+    )
+    parser.add_argument('--width', type=int, default=1200)
+    parser.add_argument('--height', type=int, default=800)
+    parser.add_argument(
+        '--plotlyjs', choices=['include', 'directory', 'cdn'], default='directory'
+    )
+    parser.add_argument(
+        '--combine', action='store_true', help='plot all files together in one run'
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='plot in compact memory mode, like the switch in the data management panel',
+    )
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    # urls and existing paths are taken as they are, even if they contain wildcard
+    # characters, and everything else is expanded like the shell would
+    tdms_paths = sorted(
+        {
+            pattern
+            for pattern in args.globs
+            if is_url(pattern) or Path(pattern).is_file()
+        }
+        | {
+            path
+            for pattern in args.globs
+            if not is_url(pattern)
+            for path in glob.glob(pattern, recursive=True)
+            if Path(path).is_file()
+        }
+    )
+    if not tdms_paths:
+        parser.error('no files match the given globs')
+    runs = [tdms_paths] if args.combine else [[path] for path in tdms_paths]
+    logger.info(f'Rendering {len(runs)} runs with {args.jobs} workers.')
+
+    n_failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {
+            pool.submit(
+                render_run,
+                run,
+                args.axis,
+                args.output_dir,
+                args.filename,
+                args.formats,
+                args.width,
+                args.height,
+                args.plotlyjs,
+                args.compact,
+            ): run
+            for run in runs
+        }
+        for future in as_completed(futures):
+            try:
+                logger.info(f'{futures[future]} rendered to {future.result()}')
+            # a run can fail in any of the libraries it goes through, which shouldn't
+            # stop the rest of the batch. The traceback is logged
+            except Exception:  # noqa: BLE001
+                logger.exception(f'{futures[future]} failed to render')
+                n_failed += 1
+    if n_failed:
+        logger.error(f'{n_failed} of {len(runs)} runs failed.')
+        sys.exit(1)
+
+
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['batch']:
+        run_batch(sys.argv[2:])
+        sys.exit()
     HOST = '127.0.0.1'
     PORT = 8050
+    start_cleanup()
     open_first_tab()
     app.run(host=HOST, port=PORT, debug=True, use_reloader=False)
@@ -0,0 +1,457 @@
+"""Reading tdms files straight from an HTTP server with range requests.
+
+nptdms only needs a seekable file object, and when it is given one it reads the segment
+headers and then just the data chunks of the channels asked for. RemoteFile is such a
+file object which fetches the parts of the file being read with HTTP range requests,
+so plotting a couple of channels out of a large file on a test-stand server transfers
+those channels and the metadata instead of the whole file.
+
+Fetched data goes through a bounded on-disk cache of fixed-size blocks shared by every
+file and process, with read-ahead on sequential access, and all requests go through
+one pooled session. When the server has the .tdms_index file written next to a tdms
+file, the lead-in and metadata of every segment are read from it in one go instead of
+a few bytes at the start of every segment.
+"""
+
+import bisect
+import hashlib
+import io
+import os
+import re
+import tempfile
+from collections import OrderedDict
+from pathlib import Path, PurePosixPath
+from threading import Lock
+from typing import TYPE_CHECKING
+from urllib.parse import unquote, urlparse
+
+if TYPE_CHECKING:
+    import requests
+
+REMOTE_CACHE_PATH = Path('./remote_cache/')
+# Upper limit on the size of REMOTE_CACHE_PATH, least recently used blocks are evicted
+# past it
+REMOTE_CACHE_MAX_BYTES = 2 * 1024**3
+# Size of the blocks in which remote files are fetched and cached. Every read is
+# rounded out to whole blocks, so they have to be small next to the chunks of a
+# channel, which are only a few kB per segment in files written by streaming
+# acquisitions
+BLOCK_SIZE = 8 * 1024
+# Upper limit on the number of blocks fetched ahead of sequential reads. The read-ahead
+# starts at one block and doubles with every sequential read of at least a block, while
+# reads elsewhere in the file (e.g. the chunks of one channel between those of the
+# others) and small reads (e.g. the lead-in and metadata of a segment) fetch only the
+# blocks they need
+MAX_READ_AHEAD_BLOCKS = 4 * 1024**2 // BLOCK_SIZE
+# Number of recently read blocks of each file kept in memory
+MEMORY_BLOCKS = 8
+# Size of the lead-in at the start of every tdms segment, which is followed by the
+# metadata of the segment
+LEAD_IN_SIZE = 28
+# Flag of the table of contents in the lead-in for segments in big-endian byte order
+TOC_BIG_ENDIAN = 1 << 6
+# Next segment offset in the lead-in of a segment which wasn't finished being written
+INCOMPLETE_SEGMENT = 2**64 - 1
+# Seconds to wait for the server to connect and to respond
+TIMEOUT_S = 30
+
+_session = None
+_session_lock = Lock()
+
+
+def is_url(source: str | os.PathLike) -> bool:
+    """Whether a file list entry or batch argument refers to a remote file."""
+    return isinstance(source, str) and re.match(r'https?://', source) is not None
+
+
+def url_name(url: str) -> str:
+    """Filename at the end of a url, e.g. 'run 1.tdms' for .../run%201.tdms?x=1."""
+    return PurePosixPath(unquote(urlparse(url).path)).name
+
+
+def index_url(url: str) -> str:
+    """Url of the index file written next to a tdms file, e.g. .../run.tdms_index?x=1."""
+    parsed = urlparse(url)
+    return parsed._replace(path=parsed.path + '_index').geturl()
+
+
+def index_metadata(index: bytes) -> tuple[list[int], list[bytes]]:
+    """Lead-in and metadata of every segment of a tdms file, taken from its index file.
+
+    An index file holds the lead-in and metadata of the segments of its tdms file back
+    to back, with the tag b'TDSh' in place of b'TDSm'. Segments are listed until the
+    index ends or stops making sense, e.g. while it is still being written.
+
+    Args:
+        index (bytes): contents of the index file
+
+    Returns:
+        tuple of length 2:
+            list[int]: position of every listed segment in the tdms file
+            list[bytes]: lead-in and metadata of every listed segment, as they are in
+                the tdms file
+    """
+    positions, metadata = [], []
+    index_position = segment_position = 0
+    while index[index_position : index_position + 4] == b'TDSh':
+        lead_in = index[index_position : index_position + LEAD_IN_SIZE]
+        if len(lead_in) < LEAD_IN_SIZE:
+            break
+        toc = int.from_bytes(lead_in[4:8], 'little')
+        byteorder = 'big' if toc & TOC_BIG_ENDIAN else 'little'
+        next_segment_offset = int.from_bytes(lead_in[12:20], byteorder)
+        raw_data_offset = int.from_bytes(lead_in[20:28], byteorder)
+        metadata_stop = index_position + LEAD_IN_SIZE + raw_data_offset
+        if metadata_stop > len(index) or raw_data_offset > next_segment_offset:
+            break
+        positions.append(segment_position)
+        metadata.append(b'TDSm' + index[index_position + 4 : metadata_stop])
+        if next_segment_offset == INCOMPLETE_SEGMENT:
+            break
+        segment_position += LEAD_IN_SIZE + next_segment_offset
+        index_position = metadata_stop
+    return positions, metadata
+
+
+def session() -> 'requests.Session':
+    """The pooled session shared by every remote file, created on first use.
+
+    Keeping connections alive matters here, since reading a file takes many small
+    requests to the same server.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=os.cpu_count())
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+class BlockCache:
+    """Bounded on-disk cache of the blocks of remote files.
+
+    Blocks are stored as one file each under <path>/<file key>/<block index>. The
+    modification time of a block is bumped whenever it is read, and once the cache grows
+    past max_bytes the least recently used blocks are deleted until it is back under 90%
+    of that. Blocks are written under a unique name first and then renamed, since the
+    cache is shared with the batch workers.
+
+    Args:
+        path (Path): directory of the cache
+        max_bytes (int): upper limit on the total size of the cached blocks
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.size = None
+
+    def get(self, key: str, index: int) -> bytes | None:
+        """Returns a cached block, or None if it isn't cached."""
+        block_path = self.path / key / str(index)
+        try:
+            data = block_path.read_bytes()
+            os.utime(block_path)
+        except FileNotFoundError:
+            # evicted in between, possibly by another process
+            return None
+        return data
+
+    def has(self, key: str, index: int) -> bool:
+        """Whether a block is cached, without reading it."""
+        return (self.path / key / str(index)).is_file()
+
+    def put(self, key: str, index: int, data: bytes):
+        """Stores a block, evicting the least recently used ones if over budget."""
+        block_path = self.path / key / str(index)
+        block_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_fd, partial_name = tempfile.mkstemp(
+            suffix='.part', dir=block_path.parent
+        )
+        with open(partial_fd, 'wb') as partial_file:
+            partial_file.write(data)
+        Path(partial_name).replace(block_path)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(
+                    path.stat().st_size
+                    for path in self.path.glob('*/*')
+                    if path.is_file()
+                )
+            else:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Deletes the least recently used blocks until under 90% of the budget."""
+        blocks = []
+        for block_path in self.path.glob('*/*'):
+            try:
+                stat = block_path.stat()
+            except FileNotFoundError:
+                continue
+            blocks.append((stat.st_mtime, stat.st_size, block_path))
+        blocks.sort()
+        self.size = sum(size for _, size, _ in blocks)
+        for _, size, block_path in blocks:
+            if self.size <= 0.9 * self.max_bytes:
+                break
+            block_path.unlink(missing_ok=True)
+            self.size -= size
+
+
+BLOCK_CACHE = BlockCache(REMOTE_CACHE_PATH, REMOTE_CACHE_MAX_BYTES)
+
+
+class RemoteFile(io.RawIOBase):
+    """Read-only, seekable file object over a file served by an HTTP server.
+
+    The server has to support range requests, like nginx, Apache and object storage
+    do. Reads are served from fixed-size blocks: the most
+    recent ones from memory, then from the on-disk cache, and any missing blocks are
+    fetched with a single range request. When reads are sequential, the blocks after
+    them are fetched ahead in the same request, doubling up to MAX_READ_AHEAD_BLOCKS.
+    Reads of the lead-in and metadata of a segment listed in the index file are served
+    from memory instead, see load_index.
+
+    Blocks are only shared through the on-disk cache if the server identifies the
+    version of the file with an ETag or Last-Modified header, otherwise a changed file
+    can't be told apart from the cached one. They are kept in a temporary cache of
+    this file object in that case, deleted when it is closed, and digest is None so the
+    decoded data isn't cached either.
+
+    Args:
+        url (str): http or https url of the file
+        cache (BlockCache): on-disk cache to read blocks from and store them in
+        index (bool): whether to look for the index file next to the file
+
+    Raises:
+        ValueError: if the server doesn't support range requests or doesn't report the
+            size of the file
+        requests.HTTPError: if the server responds with an error
+    """
+
+    def __init__(self, url: str, cache: BlockCache = BLOCK_CACHE, index: bool = True):
+        super().__init__()
+        self.url = url
+        self.cache = cache
+        self.temporary_cache = None
+        response = session().head(url, allow_redirects=True, timeout=TIMEOUT_S)
+        response.raise_for_status()
+        if response.headers.get('Accept-Ranges') == 'none':
+            raise ValueError(f'{url} does not support range requests')
+        if 'Content-Length' not in response.headers:
+            raise ValueError(f'{url} does not report the size of the file')
+        self.size = int(response.headers['Content-Length'])
+        # the cached blocks are only valid for this version of the file
+        validator = response.headers.get('ETag') or response.headers.get(
+            'Last-Modified'
+        )
+        if validator is None:
+            self.temporary_cache = tempfile.TemporaryDirectory(prefix='modash-remote-')
+            self.cache = BlockCache(Path(self.temporary_cache.name), cache.max_bytes)
+            self.digest = None
+        else:
+            self.digest = hashlib.sha256(
+                f'{url}\n{validator}\n{self.size}'.encode()
+            ).hexdigest()
+        # files without a version have the temporary cache to themselves. The block size
+        # is part of the key, so blocks cached with another size are never misread
+        self.cache_key = f'{self.digest or "unversioned"}-{BLOCK_SIZE}'
+        self.position = 0
+        self.bytes_fetched = 0
+        self.blocks = OrderedDict()
+        # end of the previous read, a read starting there is sequential
+        self.previous_stop = None
+        self.read_ahead = 0
+        self.metadata_positions, self.metadata = [], []
+        if index:
+            self.load_index(cache)
+
+    def close(self):
+        super().close()
+        if self.temporary_cache is not None:
+            self.temporary_cache.cleanup()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f'negative seek position {offset}')
+        self.position = offset
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        stop = min(self.position + len(view), self.size)
+        if stop <= self.position:
+            return 0
+        metadata = self.indexed_metadata(self.position, stop)
+        if metadata is not None:
+            view[: len(metadata)] = metadata
+            # the data following the metadata doesn't continue a fetch
+            self.position, self.previous_stop = stop, None
+            return len(metadata)
+        first, last = self.position // BLOCK_SIZE, (stop - 1) // BLOCK_SIZE
+        blocks = self.load_blocks(
+            first,
+            last,
+            self.position == self.previous_stop and len(view) >= BLOCK_SIZE,
+        )
+        written = 0
+        for index, block in enumerate(blocks, first):
+            start = max(self.position - index * BLOCK_SIZE, 0)
+            end = min(stop - index * BLOCK_SIZE, len(block))
+            view[written : written + end - start] = block[start:end]
+            written += end - start
+        self.position = self.previous_stop = stop
+        return written
+
+    def readall(self) -> bytes:
+        # in one read, rather than the small reads of io.RawIOBase.readall
+        data = bytearray(max(self.size - self.position, 0))
+        return bytes(data[: self.readinto(data)])
+
+    def load_index(self, cache: BlockCache):
+        """Reads the lead-in and metadata of the segments from the index file.
+
+        Nothing is loaded if the server doesn't have an index file next to the file,
+        or if the last segment it lists doesn't match the file. An index which lists
+        fewer segments than the file has, e.g. while both are being written, is fine:
+        the metadata of the segments it doesn't list is read from the file.
+
+        Args:
+            cache (BlockCache): on-disk cache for the blocks of the index file
+        """
+        import requests
+
+        try:
+            index_file = RemoteFile(index_url(self.url), cache, index=False)
+        except (requests.RequestException, ValueError):
+            return
+        with index_file:
+            positions, metadata = index_metadata(index_file.read())
+            self.bytes_fetched += index_file.bytes_fetched
+        if not positions or positions[-1] + len(metadata[-1]) > self.size:
+            return
+        self.seek(positions[-1])
+        lead_in = self.read(LEAD_IN_SIZE)
+        self.seek(0)
+        self.previous_stop = None
+        if lead_in == metadata[-1][:LEAD_IN_SIZE]:
+            self.metadata_positions, self.metadata = positions, metadata
+
+    def indexed_metadata(self, start: int, stop: int) -> bytes | None:
+        """Bytes start to stop of the file, if they lie within indexed metadata."""
+        segment = bisect.bisect_right(self.metadata_positions, start) - 1
+        if segment < 0:
+            return None
+        position = self.metadata_positions[segment]
+        if stop - position > len(self.metadata[segment]):
+            return None
+        return self.metadata[segment][start - position : stop - position]
+
+    def load_blocks(self, first: int, last: int, sequential: bool) -> list[bytes]:
+        """Returns blocks first to last, fetching any which aren't cached.
+
+        Args:
+            first (int): index of the first block needed
+            last (int): index of the last block needed
+            sequential (bool): whether the read continues the previous one and is at
+                least a block long, which grows the read-ahead of the next fetch
+
+        Returns:
+            list[bytes]: the blocks, in order
+        """
+        blocks = {}
+        missing = []
+        for index in range(first, last + 1):
+            data = self.blocks.get(index)
+            if data is None:
+                data = self.cache.get(self.cache_key, index)
+            if data is None:
+                missing.append(index)
+            else:
+                blocks[index] = data
+        if missing:
+            if sequential:
+                self.read_ahead = min(
+                    max(self.read_ahead * 2, 1), MAX_READ_AHEAD_BLOCKS
+                )
+            else:
+                self.read_ahead = 0
+            fetch_last = missing[-1]
+            if fetch_last == last:
+                # read-ahead stops at the end of the file or the first cached block
+                n_blocks = -(-self.size // BLOCK_SIZE)
+                while fetch_last < min(
+                    last + self.read_ahead, n_blocks - 1
+                ) and not self.cache.has(self.cache_key, fetch_last + 1):
+                    fetch_last += 1
+            blocks |= self.fetch(missing[0], fetch_last)
+        # the blocks read are remembered last, so the read-ahead doesn't push them out,
+        # and the read-ahead from its far end, so the blocks read next are kept longest
+        for index in sorted(
+            blocks,
+            key=lambda index: (index <= last, index if index <= last else -index),
+        ):
+            self.remember(index, blocks[index])
+        return [blocks[index] for index in range(first, last + 1)]
+
+    def fetch(self, first: int, last: int) -> dict[int, bytes]:
+        """Fetches blocks first to last with one range request and caches them.
+
+        Args:
+            first (int): index of the first block to fetch
+            last (int): index of the last block to fetch
+
+        Returns:
+            dict[int, bytes]: the fetched blocks by index
+
+        Raises:
+            ValueError: if the server doesn't support range requests
+            requests.HTTPError: if the server responds with an error
+        """
+        start, stop = first * BLOCK_SIZE, min((last + 1) * BLOCK_SIZE, self.size)
+        # streamed, so a server ignoring the range doesn't send the whole file first
+        with session().get(
+            self.url,
+            headers={'Range': f'bytes={start}-{stop - 1}'},
+            timeout=TIMEOUT_S,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise ValueError(f'{self.url} does not support range requests')
+            data = response.content
+        self.bytes_fetched += len(data)
+        blocks = {}
+        for index in range(first, last + 1):
+            offset = (index - first) * BLOCK_SIZE
+            blocks[index] = data[offset : offset + BLOCK_SIZE]
+            self.cache.put(self.cache_key, index, blocks[index])
+        return blocks
+
+    def remember(self, index: int, data: bytes):
+        """Keeps a block in memory, forgetting the least recently used if needed."""
+        self.blocks[index] = data
+        self.blocks.move_to_end(index)
+        while len(self.blocks) > MEMORY_BLOCKS:
+            self.blocks.popitem(last=False)
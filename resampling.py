@@ -0,0 +1,94 @@
+"""Resampling of MoDash figures, kept separate so plotly_resampler loads on first use."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from plotly_resampler import FigureResampler
+
+# Thread pool shared by every figure for aggregating traces concurrently. The numpy and
+# tsdownsample aggregators release the GIL, so threads scale with cores here.
+RESAMPLE_POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+
+def shared_time_index(timestamps: np.ndarray) -> pd.DatetimeIndex:
+    """Wraps datetime64 timestamps in an index which several traces can share.
+
+    FigureResampler turns datetime64 arrays given as hf_x into a new index for every
+    trace, copying the timestamps each time, whereas an index given as hf_x is kept as
+    is. Wrapping the timestamps of a group once means all the traces of that group refer
+    to the same int64 epoch data, both in memory and in the pickled server-side cache.
+
+    Args:
+        timestamps (np.ndarray): datetime64 timestamps, which are not copied
+
+    Returns:
+        pd.DatetimeIndex: index viewing the same memory as the timestamps
+    """
+    return pd.DatetimeIndex(timestamps, copy=False)
+
+
+class ParallelFigureResampler(FigureResampler):
+    """FigureResampler which aggregates the traces of a relayout event concurrently.
+
+    The stock implementation resamples every trace one after another, so zoom latency
+    grows linearly with the number of traces. Only the traces on the x-axis affected by
+    the relayout event are resampled (same filtering as the parent class), but they are
+    dispatched to RESAMPLE_POOL instead of being handled in a loop.
+    """
+
+    def _check_update_figure_dict(
+        self,
+        figure: dict,
+        start: float | str | None = None,
+        stop: float | str | None = None,
+        layout_xaxis_filter: str | None = None,
+        updated_trace_indices: list[int] | None = None,
+    ) -> list[int]:
+        if updated_trace_indices is None:
+            updated_trace_indices = []
+
+        trace_xaxis_filter = None
+        if layout_xaxis_filter is not None:
+            layout_trace_mapping = self._layout_xaxis_to_trace_xaxis_mapping()
+            trace_xaxis_filter = layout_trace_mapping[layout_xaxis_filter]
+
+        # skipping traces which were already updated or which sit on an x-axis that
+        # wasn't touched by the relayout event
+        indices = [
+            idx
+            for idx, trace in enumerate(figure['data'])
+            if idx not in updated_trace_indices
+            and (
+                trace_xaxis_filter is None
+                or trace.get('xaxis', 'x') in trace_xaxis_filter
+            )
+        ]
+        updated_traces = RESAMPLE_POOL.map(
+            lambda idx: self._check_update_trace_data(
+                figure['data'][idx], start=start, end=stop
+            ),
+            indices,
+        )
+        for idx, updated_trace in zip(indices, updated_traces):
+            if updated_trace is not None:
+                updated_trace_indices.append(idx)
+        return updated_trace_indices
+
+    def apply_relayout(self, relayout_data: dict):
+        """Applies relayout data to the figure itself instead of the front-end.
+
+        Used to restore a saved view: the layout is updated and the traces are
+        resampled for the new x-range, just like they would be on a zoom.
+
+        Args:
+            relayout_data (dict): flat relayout data as sent by the front-end, e.g.
+                {'xaxis.range[0]': ..., 'xaxis.range[1]': ...}
+        """
+        self.plotly_relayout(relayout_data)
+        update_data = self._construct_update_data(relayout_data)
+        if self._is_no_update(update_data):
+            return
+        for trace_update in update_data[1:]:
+            self.data[trace_update.pop('index')].update(trace_update)
@@ -0,0 +1,324 @@
+"""Spectral analysis of the full resolution data behind MoDash figures.
+
+The resampled traces only show a few thousand points, which hides any oscillation
+faster than the resampled point spacing. The spectra here are computed from the
+full resolution data of the visible x-range instead. Every spectrum is an average over
+segments of the window, which also caps the cost of long windows: at most MAX_SEGMENTS
+evenly spaced segments are transformed, however long the window is or however much
+time it spans.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+# Upper limit on the number of segments averaged into one spectrum
+MAX_SEGMENTS = 128
+# Upper limit on the length of a single fft in 'fft' mode, longer windows are averaged
+MAX_FFT_LENGTH = 2**16
+# Number of samples transformed at once, which bounds the memory of the intermediates
+BATCH_SAMPLES = 2**22
+# Gaps between timestamps longer than this many sample spacings split a window into
+# runs which are transformed separately, shorter ones are interpolated over
+MAX_GAP_SPACINGS = 4
+# Number of spectra kept in SPECTRUM_CACHE
+SPECTRUM_CACHE_SIZE = 256
+
+# Spectra already computed, keyed by trace, window and parameters, least recently used
+# first
+SPECTRUM_CACHE: OrderedDict[tuple, tuple[np.ndarray, np.ndarray]] = OrderedDict()
+SPECTRUM_CACHE_LOCK = Lock()
+
+
+def segments(values: np.ndarray, length: int, step: int) -> np.ndarray:
+    """Splits a signal into segments, evenly spaced if there are too many of them.
+
+    Args:
+        values (np.ndarray): 1-d signal
+        length (int): number of samples per segment
+        step (int): number of samples between the starts of consecutive segments
+
+    Returns:
+        np.ndarray: read-only view of the signal, one segment per row, with at most
+            MAX_SEGMENTS rows
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(values, length)[::step]
+    if len(windows) > MAX_SEGMENTS:
+        windows = windows[np.linspace(0, len(windows) - 1, MAX_SEGMENTS).astype(int)]
+    return windows
+
+
+def mean_magnitude(windows: np.ndarray, window: np.ndarray, power: int) -> np.ndarray:
+    """Averages the magnitude of the fft of every segment, a batch of segments at a time.
+
+    Each segment is detrended by its mean and weighted by the window before its fft.
+
+    Args:
+        windows (np.ndarray): one segment per row
+        window (np.ndarray): weights applied to every segment
+        power (int): 1 to average the magnitudes, 2 to average the power
+
+    Returns:
+        np.ndarray: mean magnitude of every frequency of the one-sided spectrum
+    """
+    total = np.zeros(len(window) // 2 + 1)
+    batch = max(BATCH_SAMPLES // len(window), 1)
+    for first in range(0, len(windows), batch):
+        rows = windows[first : first + batch]
+        spectra = np.fft.rfft((rows - rows.mean(axis=1, keepdims=True)) * window)
+        total += (np.abs(spectra) ** power).sum(axis=0)
+    return total / len(windows)
+
+
+def segments_psd(
+    windows: np.ndarray, sample_rate: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """One-sided power spectral density averaged over segments of a signal.
+
+    Segments are detrended by their mean and weighted by a Hann window before being
+    averaged, the same as scipy.signal.welch with its defaults.
+
+    Args:
+        windows (np.ndarray): one segment per row, sampled at a constant rate
+        sample_rate (float): sampling frequency in Hz
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: frequencies in Hz and the power spectral density
+            in units² / Hz
+    """
+    nperseg = windows.shape[1]
+    window = np.hanning(nperseg)
+    psd = mean_magnitude(windows, window, 2) / (sample_rate * (window**2).sum())
+    # folding the negative frequencies, except for DC and the nyquist frequency
+    psd[1 : None if nperseg % 2 else -1] *= 2
+    return np.fft.rfftfreq(nperseg, 1 / sample_rate), psd
+
+
+def segments_amplitude(
+    windows: np.ndarray, sample_rate: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """One-sided amplitude spectrum averaged over segments of a signal.
+
+    Each segment gets a single Hann windowed fft and their amplitudes are averaged.
+
+    Args:
+        windows (np.ndarray): one segment per row, sampled at a constant rate
+        sample_rate (float): sampling frequency in Hz
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: frequencies in Hz and the amplitude of each
+            frequency, in the units of the signal
+    """
+    length = windows.shape[1]
+    window = np.hanning(length)
+    amplitude = mean_magnitude(windows, window, 1) / window.sum()
+    # folding the negative frequencies, except for DC and the nyquist frequency
+    amplitude[1 : None if length % 2 else -1] *= 2
+    return np.fft.rfftfreq(length, 1 / sample_rate), amplitude
+
+
+def welch_psd(
+    values: np.ndarray, sample_rate: float, nperseg: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """One-sided power spectral density using Welch's method.
+
+    Segments overlap by half, see segments_psd.
+
+    Args:
+        values (np.ndarray): 1-d signal sampled at a constant rate
+        sample_rate (float): sampling frequency in Hz
+        nperseg (int): number of samples per segment, reduced to the length of the
+            signal if it is shorter
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: frequencies in Hz and the power spectral density
+            in units² / Hz
+    """
+    nperseg = min(nperseg, len(values))
+    return segments_psd(segments(values, nperseg, max(nperseg // 2, 1)), sample_rate)
+
+
+def amplitude_spectrum(
+    values: np.ndarray, sample_rate: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """One-sided amplitude spectrum from a single Hann windowed fft.
+
+    Windows longer than MAX_FFT_LENGTH samples are split into segments of that length
+    and their amplitudes are averaged, which keeps the frequency resolution fine while
+    bounding the cost.
+
+    Args:
+        values (np.ndarray): 1-d signal sampled at a constant rate
+        sample_rate (float): sampling frequency in Hz
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: frequencies in Hz and the amplitude of each
+            frequency, in the units of the signal
+    """
+    length = min(len(values), MAX_FFT_LENGTH)
+    return segments_amplitude(segments(values, length, length), sample_rate)
+
+
+def gapless_runs(
+    timestamps: np.ndarray, spacing: np.timedelta64
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Splits sorted timestamps into runs at gaps longer than MAX_GAP_SPACINGS.
+
+    Args:
+        timestamps (np.ndarray): sorted datetime64 timestamps
+        spacing (np.timedelta64): nominal time between samples
+
+    Returns:
+        tuple of length 3:
+            np.ndarray: index of the first timestamp of each run
+            np.ndarray: index after the last timestamp of each run
+            np.ndarray: number of samples at the nominal spacing which fit in each run
+    """
+    breaks = np.flatnonzero(np.diff(timestamps) > MAX_GAP_SPACINGS * spacing) + 1
+    run_starts = np.concatenate([[0], breaks])
+    run_stops = np.concatenate([breaks, [len(timestamps)]])
+    run_lengths = (timestamps[run_stops - 1] - timestamps[run_starts]) // spacing + 1
+    return run_starts, run_stops, run_lengths.astype(int)
+
+
+def resampled_segments(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    spacing: np.timedelta64,
+    length: int,
+    step: int,
+) -> np.ndarray:
+    """Segments of an irregularly sampled signal, interpolated onto a constant rate.
+
+    Segments are laid out within each of the gapless_runs on a grid of the given
+    spacing starting at its first timestamp, step grid points apart. At most
+    MAX_SEGMENTS of them are picked, evenly spaced over all runs, and only the samples
+    of those are interpolated, so the work doesn't depend on the time spanned.
+
+    Args:
+        timestamps (np.ndarray): sorted datetime64 timestamps of the signal
+        values (np.ndarray): 1-d signal
+        spacing (np.timedelta64): time between the samples of a segment
+        length (int): number of samples per segment
+        step (int): number of samples between the starts of consecutive segments
+
+    Returns:
+        np.ndarray: one segment per row, with at most MAX_SEGMENTS rows and none if no
+            run is long enough for a segment
+    """
+    run_starts, run_stops, run_lengths = gapless_runs(timestamps, spacing)
+    run_segments = np.maximum((run_lengths - length) // step + 1, 0)
+    n_segments = run_segments.sum()
+    picked = np.linspace(0, n_segments - 1, min(n_segments, MAX_SEGMENTS)).astype(int)
+    # run of every picked segment and its position within the run
+    first_segments = np.cumsum(run_segments) - run_segments
+    runs = np.searchsorted(first_segments, picked, 'right') - 1
+    grid = np.arange(length)
+    windows = np.empty((len(picked), length))
+    for row, (run, segment) in enumerate(zip(runs, picked - first_segments[runs])):
+        grid_start = timestamps[run_starts[run]] + segment * step * spacing
+        # the samples within the segment and the nearest one on either side of it
+        lo = max(np.searchsorted(timestamps, grid_start, 'right') - 1, run_starts[run])
+        hi = min(
+            np.searchsorted(timestamps, grid_start + (length - 1) * spacing) + 1,
+            run_stops[run],
+        )
+        windows[row] = np.interp(
+            grid, (timestamps[lo:hi] - grid_start) / spacing, values[lo:hi]
+        )
+    return windows
+
+
+def window_spectrum(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    start: np.datetime64 | None,
+    stop: np.datetime64 | None,
+    method: str,
+    nperseg: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Spectrum of one channel over a window of time.
+
+    Blank values, e.g. from aligning channels of different timestamp groups, are left
+    out and the sampling rate is taken from the median spacing of the remaining
+    timestamps. If the spacing isn't constant, the segments are taken from the parts of
+    the window without long gaps and interpolated onto timestamps which are, see
+    resampled_segments.
+
+    Args:
+        timestamps (np.ndarray): sorted datetime64 timestamps of the full resolution
+            data
+        values (np.ndarray): full resolution data of the channel
+        start (np.datetime64 | None): start of the window, or None for the first sample
+        stop (np.datetime64 | None): end of the window, or None for the last sample
+        method (str): 'psd' for segments overlapping by half, like welch_psd, or 'fft'
+            for segments of up to MAX_FFT_LENGTH samples, like amplitude_spectrum
+        nperseg (int): number of samples per segment in 'psd' mode
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: frequencies in Hz and the spectrum, both empty
+            if no part of the window without gaps spans three samples
+    """
+    timestamps = np.asarray(timestamps)
+    first = 0 if start is None else np.searchsorted(timestamps, start)
+    last = (
+        len(timestamps) if stop is None else np.searchsorted(timestamps, stop, 'right')
+    )
+    timestamps = timestamps[first:last]
+    values = np.asarray(values[first:last])
+    finite = np.isfinite(values)
+    if not finite.all():
+        timestamps, values = timestamps[finite], values[finite]
+    steps = np.diff(timestamps)
+    positive_steps = steps[steps > np.timedelta64(0)]
+    if not len(positive_steps):
+        return np.empty(0), np.empty(0)
+    spacing = np.median(positive_steps)
+    constant = (steps == spacing).all()
+    longest = len(values) if constant else gapless_runs(timestamps, spacing)[2].max()
+    if longest < 3:
+        # too short for a Hann window with any weight in it
+        return np.empty(0), np.empty(0)
+    length = min(nperseg if method == 'psd' else MAX_FFT_LENGTH, longest)
+    step = max(length // 2, 1) if method == 'psd' else length
+    if constant:
+        windows = segments(values, length, step)
+    else:
+        # gaps and jitter are interpolated away, the transforms need a constant rate
+        windows = resampled_segments(timestamps, values, spacing, length, step)
+    sample_rate = np.timedelta64(1, 's') / spacing
+    if method == 'psd':
+        return segments_psd(windows, sample_rate)
+    return segments_amplitude(windows, sample_rate)
+
+
+def cached_window_spectrum(
+    key: tuple,
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    start: np.datetime64 | None,
+    stop: np.datetime64 | None,
+    method: str,
+    nperseg: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """window_spectrum, looked up in SPECTRUM_CACHE first.
+
+    Args:
+        key (tuple): identifies the full resolution data of the trace, e.g. its uid
+        timestamps, values, start, stop, method, nperseg: see window_spectrum
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: frequencies in Hz and the spectrum
+    """
+    key = (*key, start, stop, method, nperseg if method == 'psd' else None)
+    with SPECTRUM_CACHE_LOCK:
+        if key in SPECTRUM_CACHE:
+            SPECTRUM_CACHE.move_to_end(key)
+            return SPECTRUM_CACHE[key]
+    spectrum = window_spectrum(timestamps, values, start, stop, method, nperseg)
+    with SPECTRUM_CACHE_LOCK:
+        SPECTRUM_CACHE[key] = spectrum
+        while len(SPECTRUM_CACHE) > SPECTRUM_CACHE_SIZE:
+            SPECTRUM_CACHE.popitem(last=False)
+    return spectrum